@@ -0,0 +1,302 @@
+"""
+Benchmark of the menu pipeline over a corpus of menu images.
+
+Runs process_menu_image, or one stage of it in isolation, over every image of the corpus and
+reports pages per second, latency percentiles, peak memory and OCR calls per page, as JSON
+that can be compared against a stored baseline.
+
+Example:
+    python benchmark.py --images ./real_menu_card_images --stage full --repeat 3 --output bench.json
+    python benchmark.py --stage detect --mode cold --baseline bench.json
+"""
+import os
+import sys
+import json
+import time
+import glob
+import argparse
+import platform
+import numpy as np
+import cv2
+
+import model_registry
+from image_io import load_image
+from instrumentation import metrics
+from yolov8_menu_card.model_detect_bbox import get_bounding_boxes
+from image_to_text.utils_ocr import extract_text_from_components, OCR_OPTIONS
+from image_to_text.image_to_text import process_menu_image, decode_page, arrange_menu_items, IMAGE_EXTENSIONS
+
+# Stages that can be benchmarked
+STAGES = ("full", "decode", "detect", "organize", "ocr")
+
+# Metrics compared against the baseline, and whether higher values are better
+COMPARED_METRICS = {
+    "pages_per_second": True,
+    "latency_p50": False,
+    "latency_p95": False,
+    "latency_p99": False,
+    "peak_rss_mb": False,
+    "ocr_calls_per_page": False
+}
+
+
+def peak_rss_mb():
+    """
+    Returns the peak resident set size of the current process, in megabytes.
+
+    Returns:
+        float: Peak RSS in MB, or None if it cannot be measured on this platform.
+    """
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in bytes on macOS and in kilobytes on Linux
+        return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+    except ImportError:
+        pass
+    try:
+        import psutil
+        memory = psutil.Process().memory_info()
+        return getattr(memory, "peak_wset", memory.rss) / (1024 * 1024)
+    except ImportError:
+        return None
+
+
+def list_corpus(images):
+    """
+    Lists the images of the corpus.
+
+    Args:
+        images (str): Directory of images, or a glob pattern.
+
+    Returns:
+        list: Sorted image paths.
+    """
+    if os.path.isdir(images):
+        paths = [os.path.join(images, name) for name in os.listdir(images)]
+    else:
+        paths = glob.glob(images)
+    return sorted(path for path in paths if path.lower().endswith(IMAGE_EXTENSIONS))
+
+
+def prepare_inputs(stage, paths, ocr_batch_size=None, detect_scale=1, weights_path=model_registry.DEFAULT_YOLO_WEIGHTS, tile_size=None):
+    """
+    Precomputes the input of the benchmarked stage for each page, so only that stage is timed.
+
+    Args:
+        stage (str): One of STAGES.
+        paths (list): Image paths.
+        ocr_batch_size (int, optional): OCR batch size used by the pipeline.
+        detect_scale (int): Downscaling factor of the detector input.
+        weights_path (str): Detector weights (.pt or .onnx).
+        tile_size (int, optional): Tile size of tiled detection, or None for whole-page detection.
+
+    Returns:
+        list: One input per page.
+    """
+    if stage in ("full", "decode"):
+        # Keep the encoded bytes in memory so disk reads are not part of the measurement
+        inputs = []
+        for path in paths:
+            with open(path, "rb") as f:
+                inputs.append(f.read())
+        return inputs
+
+    images = [decode_page(path) for path in paths]
+    if stage == "detect":
+        return images
+
+    boxes = [get_bounding_boxes(image, weights_path=weights_path, detect_scale=detect_scale, tile_size=tile_size) for image in images]
+    if stage == "organize":
+        return boxes
+
+    return [(image, arrange_menu_items(page_boxes)) for image, page_boxes in zip(images, boxes)]
+
+
+def run_stage(stage, page_input, ocr_batch_size=None, detect_scale=1, dedup=False, weights_path=model_registry.DEFAULT_YOLO_WEIGHTS, tile_size=None):
+    """
+    Runs the benchmarked stage on one page.
+
+    Args:
+        stage (str): One of STAGES.
+        page_input (object): Input of the page, as returned by prepare_inputs.
+        ocr_batch_size (int, optional): OCR batch size.
+        detect_scale (int): Downscaling factor of the detector input.
+        dedup (bool): Whether repeated crops are read once per page.
+        weights_path (str): Detector weights (.pt or .onnx).
+        tile_size (int, optional): Tile size of tiled detection, or None for whole-page detection.
+    """
+    if stage == "full":
+        process_menu_image(page_input, ocr_batch_size=ocr_batch_size, detect_scale=detect_scale, dedup=dedup, weights_path=weights_path, tile_size=tile_size)
+    elif stage == "decode":
+        load_image(page_input)
+    elif stage == "detect":
+        get_bounding_boxes(page_input, weights_path=weights_path, detect_scale=detect_scale, tile_size=tile_size)
+    elif stage == "organize":
+        arrange_menu_items(page_input)
+    elif stage == "ocr":
+        image, sorted_items = page_input
+        extract_text_from_components(image, sorted_items, batch_size=ocr_batch_size, dedup=dedup)
+    else:
+        raise ValueError(f"Unknown stage: {stage}")
+
+
+def run_benchmark(paths, stage="full", mode="warm", repeat=1, ocr_batch_size=None, detect_scale=1, dedup=False,
+                  weights_path=model_registry.DEFAULT_YOLO_WEIGHTS, detector_options=None, tile_size=None):
+    """
+    Benchmarks a stage of the pipeline over a corpus.
+
+    In 'warm' mode the models are loaded and one untimed page is processed before measuring.
+    In 'cold' mode the models are unloaded before every page, so model loading is part of
+    each measured latency.
+
+    Args:
+        paths (list): Image paths of the corpus.
+        stage (str): One of STAGES.
+        mode (str): 'warm' or 'cold'.
+        repeat (int): Number of passes over the corpus.
+        ocr_batch_size (int, optional): OCR batch size.
+        detect_scale (int): Downscaling factor of the detector input.
+        dedup (bool): Whether repeated crops are read once per page.
+        weights_path (str): Detector weights (.pt or .onnx).
+        detector_options (dict, optional): Arguments used to load the detector, e.g. ONNX Runtime thread counts.
+        tile_size (int, optional): Tile size of tiled detection, or None for whole-page detection.
+
+    Returns:
+        dict: The benchmark report.
+    """
+    if not paths:
+        raise ValueError("The corpus is empty")
+
+    # Load the detector with its options before prepare_inputs uses it
+    if stage != "decode":
+        model_registry.warm_up(yolo_weights=weights_path, yolo_options=detector_options)
+    inputs = prepare_inputs(stage, paths, ocr_batch_size=ocr_batch_size, detect_scale=detect_scale, weights_path=weights_path, tile_size=tile_size)
+    if mode == "warm":
+        model_registry.warm_up(ocr_options=OCR_OPTIONS if stage in ("full", "ocr") else None, yolo_weights=None)
+        run_stage(stage, inputs[0], ocr_batch_size, detect_scale, dedup, weights_path, tile_size)
+
+    latencies = []
+    metrics.reset()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for page_input in inputs:
+            page_start = time.perf_counter()
+            if mode == "cold":
+                model_registry.unload()
+                if stage in ("full", "detect"):
+                    model_registry.warm_up(yolo_weights=weights_path, yolo_options=detector_options)
+            run_stage(stage, page_input, ocr_batch_size, detect_scale, dedup, weights_path, tile_size)
+            latencies.append(time.perf_counter() - page_start)
+    total_seconds = time.perf_counter() - start
+
+    counters = metrics.snapshot()["counters"]
+    pages = len(latencies)
+    return {
+        "stage": stage,
+        "mode": mode,
+        "pages": pages,
+        "corpus": paths,
+        "config": {
+            "repeat": repeat, "ocr_batch_size": ocr_batch_size, "detect_scale": detect_scale, "dedup": dedup, "tile_size": tile_size,
+            "weights": os.path.basename(weights_path), "detector_options": detector_options
+        },
+        "pages_per_second": pages / total_seconds,
+        "latency_p50": float(np.percentile(latencies, 50)),
+        "latency_p95": float(np.percentile(latencies, 95)),
+        "latency_p99": float(np.percentile(latencies, 99)),
+        "latency_mean": float(np.mean(latencies)),
+        "peak_rss_mb": peak_rss_mb(),
+        "ocr_calls_per_page": counters.get("ocr_calls", 0) / pages,
+        "crops_per_page": counters.get("crops", 0) / pages,
+        # Fraction of crops read again with a full OCR pass after the recognizer-only pass
+        "ocr_escalation_rate": (counters.get("ocr_cascade_low_confidence", 0) + counters.get("ocr_cascade_multi_line", 0)) / counters["crops"] if counters.get("crops") else None,
+        "detections_per_page": counters.get("detections", 0) / pages,
+        # Fraction of crop pixels saved by the adaptive resize versus the fixed 1.5x upscale
+        "resize_pixels_saved": 1 - counters["resize_pixels"] / counters["resize_baseline_pixels"] if counters.get("resize_baseline_pixels") else None,
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "opencv_threads": cv2.getNumThreads()
+        }
+    }
+
+
+def compare_to_baseline(report, baseline, tolerance=0.1):
+    """
+    Compares a report with a baseline report of the same stage and mode.
+
+    Args:
+        report (dict): The new benchmark report.
+        baseline (dict): The stored baseline report.
+        tolerance (float): Relative change allowed before a metric counts as a regression.
+
+    Returns:
+        list: (metric, baseline value, new value, relative change, is_regression) tuples.
+    """
+    comparison = []
+    for metric, higher_is_better in COMPARED_METRICS.items():
+        old, new = baseline.get(metric), report.get(metric)
+        if old is None or new is None or old == 0:
+            continue
+        change = (new - old) / old
+        regression = change < -tolerance if higher_is_better else change > tolerance
+        comparison.append((metric, old, new, change, regression))
+    return comparison
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the menu OCR pipeline.")
+    parser.add_argument("--images", default="./real_menu_card_images", help="Directory or glob pattern of the corpus images")
+    parser.add_argument("--stage", choices=STAGES, default="full", help="Stage to benchmark")
+    parser.add_argument("--mode", choices=("warm", "cold"), default="warm", help="Warm (models preloaded) or cold (models reloaded per page)")
+    parser.add_argument("--repeat", type=int, default=1, help="Number of passes over the corpus")
+    parser.add_argument("--ocr-batch-size", type=int, default=None, help="OCR batch size (default: one OCR call per component)")
+    parser.add_argument("--detect-scale", type=int, default=1, choices=(1, 2, 4, 8), help="Downscaling factor of the detector input")
+    parser.add_argument("--dedup", action="store_true", help="Read repeated crops once per page")
+    parser.add_argument("--tile-size", type=int, default=None, help="Detect on overlapping tiles of this size")
+    parser.add_argument("--threads", type=int, default=None, help="Number of OpenCV threads")
+    parser.add_argument("--weights", default=model_registry.DEFAULT_YOLO_WEIGHTS, help="Detector weights (.pt, or .onnx for ONNX Runtime)")
+    parser.add_argument("--intra-op-threads", type=int, default=None, help="ONNX Runtime intra-op threads (.onnx weights only)")
+    parser.add_argument("--inter-op-threads", type=int, default=None, help="ONNX Runtime inter-op threads (.onnx weights only)")
+    parser.add_argument("--output", default=None, help="Path of the JSON report")
+    parser.add_argument("--baseline", default=None, help="Baseline JSON report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="Relative change allowed before a regression is reported")
+    args = parser.parse_args()
+
+    if args.threads is not None:
+        cv2.setNumThreads(args.threads)
+
+    detector_options = {}
+    if args.intra_op_threads is not None:
+        detector_options["intra_op_threads"] = args.intra_op_threads
+    if args.inter_op_threads is not None:
+        detector_options["inter_op_threads"] = args.inter_op_threads
+
+    report = run_benchmark(list_corpus(args.images), stage=args.stage, mode=args.mode, repeat=args.repeat,
+                           ocr_batch_size=args.ocr_batch_size, detect_scale=args.detect_scale, dedup=args.dedup,
+                           weights_path=args.weights, detector_options=detector_options or None, tile_size=args.tile_size)
+
+    print(f"{report['stage']} ({report['mode']}): {report['pages']} pages, {report['pages_per_second']:.2f} pages/s, "
+          f"p50 {report['latency_p50'] * 1000:.1f} ms, p95 {report['latency_p95'] * 1000:.1f} ms, p99 {report['latency_p99'] * 1000:.1f} ms, "
+          f"peak RSS {report['peak_rss_mb'] or 0:.0f} MB, {report['ocr_calls_per_page']:.1f} OCR calls/page")
+
+    if args.output is not None:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report saved to {args.output}")
+
+    if args.baseline is not None:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        comparison = compare_to_baseline(report, baseline, tolerance=args.tolerance)
+        for metric, old, new, change, regression in comparison:
+            flag = "REGRESSION" if regression else "ok"
+            print(f"{metric:>20}: {old:.4g} -> {new:.4g} ({change:+.1%}) {flag}")
+        if any(regression for *_, regression in comparison):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+Image loading shared by the detection and OCR stages, so each menu image is decoded only once.
+"""
+import os
+import cv2
+import numpy as np
+
+# cv2.imread flags that decode a JPEG directly at a reduced resolution
+REDUCED_DECODE_FLAGS = {
+    1: cv2.IMREAD_COLOR,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8
+}
+
+
+def load_image(source, reduce_factor=1):
+    """
+    Returns a BGR image from a path, raw encoded bytes or an already decoded array.
+
+    Args:
+        source (str | os.PathLike | bytes | numpy array): The image to load. Decoded arrays are
+                                                           returned as they are (no copy).
+        reduce_factor (int): Downscaling factor (1, 2, 4 or 8). Paths and bytes are decoded directly
+                             at the reduced resolution; arrays are resized.
+
+    Returns:
+        numpy array: The BGR image, or None if it could not be decoded.
+    """
+    if reduce_factor not in REDUCED_DECODE_FLAGS:
+        raise ValueError(f"reduce_factor must be one of {sorted(REDUCED_DECODE_FLAGS)}, got {reduce_factor}")
+
+    if isinstance(source, np.ndarray):
+        if reduce_factor == 1:
+            return source
+        return cv2.resize(source, None, fx=1 / reduce_factor, fy=1 / reduce_factor, interpolation=cv2.INTER_AREA)
+
+    flags = REDUCED_DECODE_FLAGS[reduce_factor]
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return cv2.imdecode(np.frombuffer(source, dtype=np.uint8), flags)
+    return cv2.imread(os.fspath(source), flags)
+
+
+def describe_source(source):
+    """
+    Returns a short description of an image source for log and error messages.
+
+    Args:
+        source (str | os.PathLike | bytes | numpy array): The image source.
+
+    Returns:
+        str: The path, or the kind and size of the in-memory image.
+    """
+    if isinstance(source, np.ndarray):
+        return f"<array {source.shape}>"
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return f"<{len(source)} bytes>"
+    return os.fspath(source)
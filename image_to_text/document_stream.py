@@ -0,0 +1,247 @@
+"""
+Streaming ingestion of large menu documents: PDFs, zip archives and directories of pages.
+
+Pages are pulled lazily, one at a time: a PDF page is only rendered, and a zip member only
+read, right before it is processed, and nothing of a page is kept once its items are written.
+Memory therefore stays at about one decoded page whatever the size of the document.
+
+Results are appended to a JSON Lines file page by page. After each page, a small checkpoint
+file records how many pages are done and how long the output file was at that point, so an
+interrupted run resumes on the next page; a partial write of the crashed page is cut off.
+PDF support needs PyMuPDF (pip install pymupdf).
+"""
+import sys
+import os
+import json
+import hashlib
+import zipfile
+import cv2
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from instrumentation import stage_timer, count
+from image_to_text.image_to_text import process_menu_image, IMAGE_EXTENSIONS
+
+# Resolution at which PDF pages are rendered
+PDF_DPI = 200
+
+# Version of the checkpoint format
+CHECKPOINT_VERSION = 1
+
+
+def _pdf_pages(path, dpi):
+    """
+    Yields a loader for each page of a PDF; the page is rendered only when the loader is called.
+    """
+    try:
+        import fitz
+    except ImportError as error:
+        raise ImportError("Reading PDF files requires PyMuPDF (pip install pymupdf)") from error
+
+    document = fitz.open(path)
+    try:
+        for page_number in range(document.page_count):
+            def load(page_number=page_number):
+                with stage_timer("render"):
+                    pixmap = document.load_page(page_number).get_pixmap(dpi=dpi, alpha=False)
+                    pixels = np.frombuffer(pixmap.samples, dtype=np.uint8).reshape(pixmap.height, pixmap.width, pixmap.n)
+                    # cvtColor copies the pixels, so the pixmap can be freed right away
+                    return cv2.cvtColor(pixels, cv2.COLOR_GRAY2BGR if pixmap.n == 1 else cv2.COLOR_RGB2BGR)
+
+            yield f"{path}#{page_number + 1}", load
+    finally:
+        document.close()
+
+
+def _zip_pages(path):
+    """
+    Yields a loader for each image of a zip archive, in member name order; the member is only
+    read (as encoded bytes) when the loader is called.
+    """
+    with zipfile.ZipFile(path) as archive:
+        names = sorted(
+            info.filename for info in archive.infolist()
+            if not info.is_dir() and info.filename.lower().endswith(IMAGE_EXTENSIONS)
+        )
+        for name in names:
+            yield f"{path}#{name}", lambda name=name: archive.read(name)
+
+
+def iter_document_pages(source, dpi=PDF_DPI):
+    """
+    Lazily lists the pages of a document, in page order.
+
+    Args:
+        source (str): A PDF, a zip archive of images, a single image, or a directory. Directories
+                      are read in file name order, and the PDFs and zip archives they contain
+                      are expanded in place.
+        dpi (int): Resolution at which PDF pages are rendered.
+
+    Yields:
+        tuple: (label, load), where label names the page (e.g. 'catalogue.pdf#12') and load() returns
+               the page as encoded bytes, a path or a BGR array. A loader must be called before
+               the next page is requested.
+    """
+    source = os.fspath(source)
+    lower = source.lower()
+    if os.path.isdir(source):
+        for path in _document_files(source):
+            yield from iter_document_pages(path, dpi)
+    elif lower.endswith(".pdf"):
+        yield from _pdf_pages(source, dpi)
+    elif lower.endswith(".zip"):
+        yield from _zip_pages(source)
+    else:
+        yield source, lambda: source
+
+
+def _document_files(source):
+    """
+    Lists the files read by iter_document_pages, in the same order.
+    """
+    if not os.path.isdir(source):
+        return [source]
+    files = []
+    for name in sorted(os.listdir(source)):
+        path = os.path.join(source, name)
+        if os.path.isdir(path) or name.lower().endswith((".pdf", ".zip") + IMAGE_EXTENSIONS):
+            files.extend(_document_files(path))
+    return files
+
+
+def document_fingerprint(source):
+    """
+    Identifies a document by its path and by the name, size and modification time of every file
+    it is read from, so a checkpoint is not resumed against another document, nor against a
+    directory whose files were added, removed or renamed (which would shift the page numbers).
+    """
+    source = os.path.abspath(source)
+    digest = hashlib.sha256()
+    for path in _document_files(source):
+        stat = os.stat(path)
+        digest.update(json.dumps([os.path.relpath(path, source), stat.st_size, stat.st_mtime]).encode())
+    return {"source": source, "files": digest.hexdigest()}
+
+
+def load_checkpoint(checkpoint_path, document):
+    """
+    Reads the checkpoint of a previous run on the same document.
+
+    Args:
+        checkpoint_path (str): Path of the checkpoint file.
+        document (dict): Fingerprint of the document being processed (see document_fingerprint).
+
+    Returns:
+        dict: The checkpoint ('pages_done', 'items', 'output_size'), or None if there is no
+              usable checkpoint for this document.
+    """
+    try:
+        with open(checkpoint_path, encoding="utf-8") as f:
+            checkpoint = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if checkpoint.get("version") != CHECKPOINT_VERSION or checkpoint.get("document") != document:
+        return None
+    return checkpoint
+
+
+def save_checkpoint(checkpoint_path, document, pages_done, items, output_size):
+    """
+    Atomically replaces the checkpoint file.
+
+    Args:
+        checkpoint_path (str): Path of the checkpoint file.
+        document (dict): Fingerprint of the document being processed (see document_fingerprint).
+        pages_done (int): Number of pages whose items are in the output file.
+        items (int): Number of items written so far.
+        output_size (int): Size in bytes of the output file after the last finished page.
+    """
+    checkpoint = {
+        "version": CHECKPOINT_VERSION,
+        "document": document,
+        "pages_done": pages_done,
+        "items": items,
+        "output_size": output_size
+    }
+    temp_path = f"{checkpoint_path}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(checkpoint, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, checkpoint_path)
+
+
+def process_document(source, output_jsonl_path, checkpoint_path=None, resume=True, dpi=PDF_DPI, verbose=False, **options):
+    """
+    Processes every page of a document with process_menu_image, streaming the items to a JSON Lines file.
+
+    Args:
+        source (str): A PDF, a zip archive of images, an image, or a directory (see iter_document_pages).
+        output_jsonl_path (str): Path of the JSON Lines output; each line is an item with its page
+                                 number and page label.
+        checkpoint_path (str, optional): Path of the checkpoint file. Defaults to the output path
+                                         with a '.checkpoint' suffix.
+        resume (bool): If True and a checkpoint of the same document exists, the pages it records
+                       as done are skipped (without being decoded). If False, the run starts over.
+        dpi (int): Resolution at which PDF pages are rendered.
+        verbose (bool): If True, prints a line per page.
+        **options: Extra keyword arguments of process_menu_image (ocr_batch_size, detect_scale, cache,
+                   fields, dedup, weights_path, tile_size, ...).
+
+    Returns:
+        dict: 'pages' (total pages done), 'items' (total items written) and 'resumed_from'
+              (pages skipped because a previous run had done them).
+    """
+    if checkpoint_path is None:
+        checkpoint_path = f"{output_jsonl_path}.checkpoint"
+
+    # Fingerprint the document once; the files must not change while it is processed
+    document = document_fingerprint(source)
+    checkpoint = load_checkpoint(checkpoint_path, document) if resume else None
+    if checkpoint is not None and os.path.exists(output_jsonl_path) and os.path.getsize(output_jsonl_path) >= checkpoint["output_size"]:
+        pages_done, items = checkpoint["pages_done"], checkpoint["items"]
+    else:
+        checkpoint = None
+        pages_done, items = 0, 0
+    resumed_from = pages_done
+
+    # Open without truncating, then cut off whatever was written after the last checkpoint
+    with open(output_jsonl_path, "a+b") as output:
+        output.truncate(checkpoint["output_size"] if checkpoint is not None else 0)
+        output.seek(0, os.SEEK_END)
+
+        for page_index, (label, load) in enumerate(iter_document_pages(source, dpi), start=1):
+            if page_index <= pages_done:
+                continue
+
+            results = process_menu_image(load(), **options)
+            lines = [json.dumps({"page": page_index, "path": label, **result.to_dict()}, ensure_ascii=False) for result in results]
+            output.write("".join(f"{line}\n" for line in lines).encode("utf-8"))
+            output.flush()
+            os.fsync(output.fileno())
+
+            pages_done, items = page_index, items + len(results)
+            save_checkpoint(checkpoint_path, document, pages_done, items, output.tell())
+            count("document_pages")
+            if verbose:
+                print(f"Page {page_index} ({label}): {len(results)} items")
+
+    if verbose:
+        print(f"Processed {pages_done - resumed_from} pages ({resumed_from} resumed) with {items} items. Results saved to {output_jsonl_path}")
+    return {"pages": pages_done, "items": items, "resumed_from": resumed_from}
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Extract the items of every page of a PDF, zip archive or directory of menu pages.")
+    parser.add_argument("source", help="PDF, zip archive, image or directory")
+    parser.add_argument("output", help="JSON Lines output file")
+    parser.add_argument("--dpi", type=int, default=PDF_DPI, help="Resolution at which PDF pages are rendered")
+    parser.add_argument("--no-resume", action="store_true", help="Ignore any checkpoint and start from the first page")
+    parser.add_argument("--ocr-batch-size", type=int, default=None)
+    parser.add_argument("--tile-size", type=int, default=None)
+    args = parser.parse_args()
+
+    process_document(args.source, args.output, resume=not args.no_resume, dpi=args.dpi, verbose=True,
+                     ocr_batch_size=args.ocr_batch_size, tile_size=args.tile_size)
@@ -1,34 +1,310 @@
 import sys
 import os
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 import cv2
+import numpy as np
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from yolov8_menu_card.model_detect_bbox import get_bounding_boxes, organize_items_with_contained_components
-from image_to_text.utils_ocr import sort_item_bboxes_by_position, filter_items_with_price, extract_text_from_components
+from model_registry import warm_up, DEFAULT_YOLO_WEIGHTS
+from instrumentation import stage_timer, count, metrics, profile_request, snapshot_delta
+from image_io import load_image, describe_source
+from yolov8_menu_card.model_detect_bbox import get_bounding_boxes, get_bounding_boxes_batch, draw_bounding_boxes, organize_items_with_contained_components, TILE_OVERLAP
+from image_to_text.utils_ocr import sort_item_bboxes_by_position, filter_items_with_price, extract_text_from_components, write_extracted_text, OCR_OPTIONS, COMPONENT_FIELDS, TARGET_LINE_HEIGHT, CASCADE_MIN_SCORE, MULTI_LINE_ASPECT
+from image_to_text.menu_results import make_item_result, box_confidences, write_jsonl
+from image_to_text.result_cache import ResultCache, image_digest, detection_cache_key, ocr_cache_key
 
-def process_menu_image(test_image_path, output_image_path="output_with_bboxes.jpg", output_txt_path="menu_text_output.txt"):
+# File extensions picked up by process_menu_directory
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".tif", ".tiff", ".webp")
+
+# Result caches opened by this process, keyed by cache directory
+_caches = {}
+
+def decode_page(source, name=None):
     """
-    Processes a menu image, detects and organizes bounding boxes, sorts items, and extracts text.
-    
+    Decodes a menu page, timing it as the 'decode' stage.
+
     Args:
-        test_image_path (str): Path to the test image.
-        output_image_path (str): Path to save the image with drawn bounding boxes.
-        output_txt_path (str): Path to save the extracted text output.
+        source (str | bytes | numpy array): Path, encoded bytes or decoded BGR image of the page.
+        name (str | bytes | numpy array, optional): Source named in the error message, if not 'source'
+                                                    itself (e.g. the path the bytes were read from).
+
+    Returns:
+        numpy array: The BGR image.
+
+    Raises:
+        ValueError: If the page cannot be decoded.
     """
-    # Get bounding boxes
-    boxes = get_bounding_boxes(test_image_path, draw=True, output_path=output_image_path)
+    with stage_timer("decode"):
+        image = load_image(source)
+    if image is None:
+        raise ValueError(f"Could not load image from {describe_source(source if name is None else name)}")
+    return image
 
+def arrange_menu_items(boxes):
+    """
+    Organizes the detected boxes of a page into items, keeps the items with a price and sorts
+    them in reading order.
+
+    Args:
+        boxes (list): List of bounding boxes with format [x1, y1, x2, y2, confidence, class_id].
+
+    Returns:
+        OrderedDict: Item bounding boxes, in reading order, mapped to their component bboxes.
+    """
     # Organize detected components by item
-    organized_items = organize_items_with_contained_components(boxes)
-    
+    with stage_timer("organize"):
+        organized_items = organize_items_with_contained_components(boxes)
+
     # Filter item bboxes with no price included
     filtered_bboxes = filter_items_with_price(organized_items)
 
-    # Sort the item bounding boxes by left-to-right, top-to-bottom criteria
-    sorted_bboxes = sort_item_bboxes_by_position(filtered_bboxes)
+    # Sort the item bounding boxes in reading order
+    with stage_timer("sort"):
+        return sort_item_bboxes_by_position(filtered_bboxes)
+
+def detect_menu_items(images, weights_path=DEFAULT_YOLO_WEIGHTS):
+    """
+    Detects the boxes of several decoded pages in one detector call and arranges their items.
+
+    Args:
+        images (list): Decoded BGR images of the pages.
+        weights_path (str): Detector weights; a '.onnx' model runs on ONNX Runtime.
+
+    Returns:
+        list: One (boxes, sorted_items) tuple per page, in input order (see arrange_menu_items).
+    """
+    all_boxes = get_bounding_boxes_batch(images, batch_size=max(len(images), 1), weights_path=weights_path)
+    return [(boxes, arrange_menu_items(boxes)) for boxes in all_boxes]
+
+def process_menu_image(test_image_path, output_image_path=None, output_txt_path=None, ocr_batch_size=None, detect_scale=1, cache=None, verbose=False, fields=COMPONENT_FIELDS, dedup=False, profile=None, profile_path=None, weights_path=DEFAULT_YOLO_WEIGHTS, tile_size=None, tile_overlap=TILE_OVERLAP):
+    """
+    Processes a menu image, detects and organizes bounding boxes, sorts items, and extracts text.
+    
+    Args:
+        test_image_path (str | bytes | numpy array): Path to the test image, its encoded bytes or the
+                                                     decoded BGR image. It is decoded only once.
+        output_image_path (str): Path to save the image with drawn bounding boxes. If None, nothing is drawn.
+        output_txt_path (str): Path to save the extracted text output. If None, no file is written.
+        ocr_batch_size (int, optional): If set, the recognizer-only first pass over the crops of the page
+                                        runs in batches of this size (see extract_text_from_components).
+        detect_scale (int): Downscaling factor (1, 2, 4 or 8) of the detector input (see get_bounding_boxes).
+        cache (ResultCache, optional): Cache of detected boxes and OCR text, keyed by the image content.
+                                       On a full hit the image is not even decoded (unless drawing).
+        verbose (bool): If True, prints the text extracted for each item.
+        fields (tuple): Components to read, e.g. ("title", "price") for a price comparison.
+        dedup (bool): If True, repeated crops (e.g. the same 'Consultar' price label) are read once per page.
+        profile (str, optional): Profiles this request: 'cprofile' or 'sampling' (see instrumentation.profile_request).
+        profile_path (str, optional): Where to write the profile. If None, a summary is printed.
+        weights_path (str): Detector weights; a '.onnx' model runs on ONNX Runtime (see get_bounding_boxes).
+        tile_size (int, optional): If set, detection runs on overlapping tiles of this size, for
+                                   very large pages (see get_bounding_boxes).
+        tile_overlap (float): Fraction of a tile shared with its neighbour, in tiled mode.
+
+    Returns:
+        list: One MenuItemResult per item, in reading order.
+    """
+    with profile_request(profile, profile_path), stage_timer("page"):
+        results = _process_menu_image(test_image_path, output_image_path, output_txt_path, ocr_batch_size, detect_scale, cache, verbose, fields, dedup, weights_path, tile_size, tile_overlap)
+    count("pages")
+    return results
+
+def _process_menu_image(test_image_path, output_image_path, output_txt_path, ocr_batch_size, detect_scale, cache, verbose, fields, dedup, weights_path, tile_size, tile_overlap):
+    """
+    Runs every stage of process_menu_image on one page; see process_menu_image for the arguments.
+    """
+    source = test_image_path
+    image = None
+    image_hash = None
+    if cache is not None:
+        # Hash the encoded bytes; they are decoded from memory if the image is needed
+        if not isinstance(source, (bytes, bytearray, memoryview, np.ndarray)):
+            with open(source, "rb") as f:
+                source = f.read()
+        image_hash = image_digest(source)
+
+    def decoded_image():
+        # Decode the image once; detection and OCR both work on this buffer
+        return decode_page(source, test_image_path)
+
+    # Get bounding boxes
+    boxes = None
+    if cache is not None:
+        detection_key = detection_cache_key(image_hash, weights_path, detect_scale, [tile_size, tile_overlap] if tile_size else None)
+        boxes = cache.get("detection", detection_key)
+        if boxes is not None and output_image_path is not None:
+            image = decoded_image()
+            draw_bounding_boxes(image.copy(), boxes, output_image_path)
+    if boxes is None:
+        image = decoded_image()
+        boxes = get_bounding_boxes(image, draw=output_image_path is not None, output_path=output_image_path, weights_path=weights_path, detect_scale=detect_scale, tile_size=tile_size, tile_overlap=tile_overlap)
+        if cache is not None:
+            cache.put("detection", detection_key, [[float(v) for v in box[:5]] + [int(box[5])] for box in boxes])
+
+    # Organize, filter and sort the items
+    sorted_bboxes = arrange_menu_items(boxes)
     
-    # Extract text from components and save to a text file
-    extract_text_from_components(test_image_path, sorted_bboxes, output_txt_path=output_txt_path)
+    # Reuse the text of a previous run on the same image and boxes
+    if cache is not None:
+        ocr_key = ocr_cache_key(image_hash, sorted_bboxes, OCR_OPTIONS, ocr_batch_size, fields, {"target_line_height": TARGET_LINE_HEIGHT, "cascade_min_score": CASCADE_MIN_SCORE, "multi_line_aspect": MULTI_LINE_ASPECT, "dedup": dedup})
+        cached = cache.get("ocr", ocr_key)
+        if cached is not None:
+            confidences = box_confidences(boxes)
+            results = [
+                make_item_result(i, item_bbox, components, texts, scores, confidences)
+                for i, ((item_bbox, components), (texts, scores)) in enumerate(zip(sorted_bboxes.items(), cached), start=1)
+            ]
+            write_extracted_text(results, output_txt_path, verbose=verbose)
+            return results
+
+    # Extract text from components
+    if image is None:
+        image = decoded_image()
+    results = extract_text_from_components(image, sorted_bboxes, output_txt_path=output_txt_path, batch_size=ocr_batch_size, bounding_boxes=boxes, verbose=verbose, fields=fields, dedup=dedup)
+    if cache is not None:
+        cache.put("ocr", ocr_key, [result.ocr_values() for result in results])
+    return results
+
+def _init_worker(weights_path=DEFAULT_YOLO_WEIGHTS, detector_options=None):
+    """
+    Loads the YOLO and PaddleOCR models once when a worker process starts.
+
+    Args:
+        weights_path (str): Detector weights used by the worker.
+        detector_options (dict, optional): Extra arguments of the detector (see model_registry.get_yolo).
+    """
+    # Keep each worker on one core for OpenCV so workers do not oversubscribe the CPU
+    cv2.setNumThreads(1)
+    warm_up(ocr_options=OCR_OPTIONS, yolo_weights=weights_path, yolo_options=detector_options)
+
+def _process_page(job):
+    """
+    Runs process_menu_image on one page and measures how long it took.
+
+    Args:
+        job (tuple): (page_index, image_path, output_image_path, output_txt_path, options, cache_dir), where
+                     output_image_path and output_txt_path may be None (nothing is drawn or written)
+                     and options are extra keyword arguments of process_menu_image.
+
+    Returns:
+        dict: Page index, image path, extracted items (MenuItemResult), output paths, processing time
+              in seconds and the work done on the page (counters and time per stage).
+    """
+    page_index, image_path, output_image_path, output_txt_path, options, cache_dir = job
+    cache = None
+    if cache_dir is not None:
+        if cache_dir not in _caches:
+            _caches[cache_dir] = ResultCache(cache_dir)
+        cache = _caches[cache_dir]
+
+    start = time.perf_counter()
+    before = metrics.snapshot()
+    items = process_menu_image(image_path, output_image_path, output_txt_path, cache=cache, **options)
+    return {
+        "metrics": snapshot_delta(before, metrics.snapshot()),
+        "page": page_index,
+        "path": image_path,
+        "items": items,
+        "output_image_path": output_image_path,
+        "output_txt_path": output_txt_path,
+        "seconds": time.perf_counter() - start
+    }
+
+def process_menu_batch(image_paths, output_dir="menu_outputs", workers=None, merged_txt_path=None, cache_dir=None, merged_jsonl_path=None, detector_options=None, draw_boxes=False, write_page_text=False, verbose=False, **options):
+    """
+    Processes several menu pages in parallel, each worker process holding its own YOLO and PaddleOCR models.
+
+    Args:
+        image_paths (list): Paths of the menu pages, in page order.
+        output_dir (str): Directory where the per-page images and text files are saved, if any.
+        workers (int, optional): Number of worker processes. Defaults to the number of CPUs;
+                                 1 processes the pages in the current process.
+        merged_txt_path (str, optional): If set, the items of every page are written to this text
+                                         file, in page order.
+        cache_dir (str, optional): Directory of a ResultCache shared by all workers.
+        merged_jsonl_path (str, optional): If set, every item of every page is also written to
+                                           this JSON Lines file, with its page number.
+        detector_options (dict, optional): Arguments used to load the detector in each worker, e.g.
+                                           {"intra_op_threads": 2} for an ONNX model.
+        draw_boxes (bool): If True, an image with the detected boxes is saved for every page. Off by
+                           default, as drawing and encoding it costs time on every page.
+        write_page_text (bool): If True, the items of every page are also written to a text file in output_dir.
+        verbose (bool): If True, prints a line per page and a summary.
+        **options: Extra keyword arguments of process_menu_image (ocr_batch_size, detect_scale, fields, dedup, weights_path, tile_size, ...).
+
+    Returns:
+        list: One dict per page, in page order, with the page index, image path, extracted items,
+              output paths, processing time in seconds and per-stage metrics.
+    """
+    if draw_boxes or write_page_text:
+        os.makedirs(output_dir, exist_ok=True)
+
+    # Prefix outputs with the page index so pages with the same file name do not collide
+    jobs = []
+    for page_index, image_path in enumerate(image_paths, start=1):
+        stem = f"{page_index:04d}_{os.path.splitext(os.path.basename(image_path))[0]}"
+        jobs.append((
+            page_index,
+            image_path,
+            os.path.join(output_dir, f"{stem}_bboxes.jpg") if draw_boxes else None,
+            os.path.join(output_dir, f"{stem}.txt") if write_page_text else None,
+            options,
+            cache_dir
+        ))
+
+    workers = min(workers or os.cpu_count() or 1, max(len(jobs), 1))
+    start = time.perf_counter()
+    worker_args = (options.get("weights_path", DEFAULT_YOLO_WEIGHTS), detector_options)
+    if workers == 1:
+        if detector_options:
+            warm_up(yolo_weights=worker_args[0], yolo_options=detector_options)
+        pages = [_process_page(job) for job in jobs]
+    else:
+        # Spawn fresh workers so no model state or thread pool is inherited from the parent
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker, initargs=worker_args) as executor:
+            # map returns results in submission order, which preserves page order
+            pages = list(executor.map(_process_page, jobs))
+    total_seconds = time.perf_counter() - start
+
+    # Merge the text of every page in page order
+    if merged_txt_path is not None:
+        with open(merged_txt_path, "w", encoding="utf-8") as f:
+            for page in pages:
+                f.write(f"# Page {page['page']}: {page['path']}\n")
+                f.write("".join(f"{result.to_line()}\n" for result in page["items"]))
+
+    if merged_jsonl_path is not None:
+        for page in pages:
+            write_jsonl(page["items"], merged_jsonl_path, append=page is not pages[0], page=page["page"], path=page["path"])
+
+    if verbose:
+        for page in pages:
+            print(f"Page {page['page']} ({page['path']}): {len(page['items'])} items in {page['seconds']:.2f}s")
+        saved = f" Merged results saved to {merged_txt_path}" if merged_txt_path is not None else ""
+        print(f"Processed {len(pages)} pages with {workers} workers in {total_seconds:.2f}s.{saved}")
+
+    return pages
+
+def process_menu_directory(directory, output_dir="menu_outputs", **kwargs):
+    """
+    Processes every menu image in a directory, in file name order, with process_menu_batch.
+
+    Args:
+        directory (str): Directory containing the menu pages.
+        output_dir (str): Directory where the outputs are saved.
+        **kwargs: Any other argument of process_menu_batch (workers, merged_txt_path, cache_dir, merged_jsonl_path, draw_boxes,
+                  write_page_text, verbose, and the process_menu_image options).
+
+    Returns:
+        list: One dict per page, as returned by process_menu_batch.
+    """
+    image_paths = sorted(
+        os.path.join(directory, name) for name in os.listdir(directory)
+        if name.lower().endswith(IMAGE_EXTENSIONS)
+    )
+    return process_menu_batch(image_paths, output_dir=output_dir, **kwargs)
 
 # Testing block
 if __name__ == "__main__":
@@ -38,4 +314,4 @@ if __name__ == "__main__":
     output_txt_path = "menu_text_output.txt"
     
     # Run the function
-    process_menu_image(test_image_path, output_image_path, output_txt_path)
+    process_menu_image(test_image_path, output_image_path, output_txt_path, verbose=True)
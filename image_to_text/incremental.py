@@ -0,0 +1,337 @@
+"""
+Incremental re-processing of menu pages that were processed before.
+
+The first time a menu is processed, its results and a grayscale copy of the page are stored
+under a menu id. When a new version of the same menu is uploaded, it is aligned to the stored
+page (identity when the layout did not move, otherwise an ORB + RANSAC homography), the two
+pages are compared item by item, and only the items whose pixels changed are read again;
+the others keep their stored text. Anything the diff cannot account for (pages that do not
+align, changes outside the known items, most items changed) falls back to a full run.
+"""
+import sys
+import os
+import re
+import json
+import dataclasses
+from collections import OrderedDict
+import cv2
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from instrumentation import stage_timer, count
+from image_io import load_image, describe_source
+from yolov8_menu_card.model_detect_bbox import ITEM_CLASS, COMPONENT_CLASSES
+from image_to_text.utils_ocr import extract_text_from_components, write_extracted_text, COMPONENT_FIELDS
+from image_to_text.menu_results import MenuItemResult, RESULT_FIELDS
+from image_to_text.image_to_text import process_menu_image
+
+# Directory where the state of each processed menu is stored
+STATE_DIR = ".menu_state"
+
+# Pages are aligned and compared with their longest side reduced to this many pixels
+WORK_MAX_SIDE = 2000
+
+# ORB keypoints detected per page, and matches needed to trust the estimated homography
+ORB_FEATURES = 3000
+MIN_MATCHES = 30
+
+# Gray level difference above which a pixel counts as changed, after a light blur
+PIXEL_DIFF_THRESHOLD = 40
+
+# Fraction of changed pixels above which a component box (and its item) counts as changed
+CHANGED_FRACTION = 0.01
+
+# Fraction of changed pixels outside every item above which the layout counts as changed
+OUTSIDE_CHANGED_FRACTION = 0.002
+
+# Fraction of changed items above which a full run is done instead
+MAX_CHANGED_ITEMS = 0.5
+
+# Class IDs of the components, by name
+_COMPONENT_CLASS_IDS = {name: class_id for class_id, name in COMPONENT_CLASSES.items()}
+
+
+def _state_paths(menu_id, state_dir):
+    """
+    Returns the paths of the stored page (.npz) and results (.json) of a menu.
+    """
+    name = re.sub(r"[^\w.-]", "_", str(menu_id))
+    return os.path.join(state_dir, f"{name}.npz"), os.path.join(state_dir, f"{name}.json")
+
+
+def work_image(image):
+    """
+    Converts a page to the grayscale working resolution used for alignment and diffing.
+
+    Args:
+        image (numpy array): BGR page.
+
+    Returns:
+        tuple: (grayscale page, scale from full resolution to working resolution).
+    """
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    scale = min(1.0, WORK_MAX_SIDE / max(gray.shape[:2]))
+    if scale < 1:
+        gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    return gray, scale
+
+
+def load_state(menu_id, state_dir=STATE_DIR):
+    """
+    Loads the stored page and results of a menu.
+
+    Args:
+        menu_id (str): Identifier of the menu.
+        state_dir (str): Directory of the stored states.
+
+    Returns:
+        tuple: (working grayscale page, scale, list of MenuItemResult), or None if the menu is unknown.
+    """
+    npz_path, json_path = _state_paths(menu_id, state_dir)
+    try:
+        with open(json_path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+        with np.load(npz_path) as data:
+            gray = data["gray"]
+    except (FileNotFoundError, ValueError, KeyError):
+        return None
+    return gray, state["scale"], [MenuItemResult.from_dict(result) for result in state["results"]]
+
+
+def save_state(menu_id, gray, scale, results, state_dir=STATE_DIR):
+    """
+    Stores the working page and results of a menu, replacing any previous version.
+
+    Args:
+        menu_id (str): Identifier of the menu.
+        gray (numpy array): Working grayscale page (see work_image).
+        scale (float): Scale from full resolution to working resolution.
+        results (list): The MenuItemResult of every item.
+        state_dir (str): Directory of the stored states.
+    """
+    os.makedirs(state_dir, exist_ok=True)
+    npz_path, json_path = _state_paths(menu_id, state_dir)
+
+    # Write to temporary files first so a reader never sees half a state
+    tmp_npz = f"{npz_path}.{os.getpid()}.tmp.npz"
+    np.savez_compressed(tmp_npz, gray=gray)
+    os.replace(tmp_npz, npz_path)
+    tmp_json = f"{json_path}.{os.getpid()}.tmp"
+    with open(tmp_json, "w", encoding="utf-8") as f:
+        json.dump({"scale": scale, "results": [result.to_dict() for result in results]}, f, ensure_ascii=False)
+    os.replace(tmp_json, json_path)
+
+
+def align_images(reference, moving, min_matches=MIN_MATCHES):
+    """
+    Estimates the homography that maps a page onto a reference page.
+
+    Pages with the same size and nearly the same pixels (a digital edit of the same file)
+    get the identity; otherwise ORB keypoints are matched and a homography is fitted with RANSAC.
+
+    Args:
+        reference (numpy array): Grayscale reference page.
+        moving (numpy array): Grayscale page to align.
+        min_matches (int): Minimum number of inlier matches to accept the homography.
+
+    Returns:
+        numpy array: 3x3 homography from 'moving' to 'reference' coordinates, or None if the pages do not align.
+    """
+    if reference.shape == moving.shape and cv2.absdiff(reference, moving).mean() < 2:
+        return np.eye(3)
+
+    orb = cv2.ORB_create(ORB_FEATURES)
+    reference_points, reference_descriptors = orb.detectAndCompute(reference, None)
+    moving_points, moving_descriptors = orb.detectAndCompute(moving, None)
+    if reference_descriptors is None or moving_descriptors is None:
+        return None
+
+    matches = cv2.BFMatcher(cv2.NORM_HAMMING, crossCheck=True).match(moving_descriptors, reference_descriptors)
+    if len(matches) < min_matches:
+        return None
+    source = np.float32([moving_points[match.queryIdx].pt for match in matches])
+    target = np.float32([reference_points[match.trainIdx].pt for match in matches])
+    homography, inliers = cv2.findHomography(source, target, cv2.RANSAC, 3.0)
+    if homography is None or inliers.sum() < min_matches:
+        return None
+    return homography
+
+
+def changed_pixels(reference, moving, homography):
+    """
+    Warps a page onto a reference page and marks the pixels that differ.
+
+    Args:
+        reference (numpy array): Grayscale reference page.
+        moving (numpy array): Grayscale page to compare.
+        homography (numpy array): 3x3 homography from 'moving' to 'reference' coordinates.
+
+    Returns:
+        tuple: Boolean masks in reference coordinates: (changed pixels, pixels covered by 'moving').
+    """
+    size = (reference.shape[1], reference.shape[0])
+    warped = cv2.warpPerspective(moving, homography, size, flags=cv2.INTER_LINEAR)
+    covered = cv2.warpPerspective(np.full(moving.shape, 255, dtype=np.uint8), homography, size, flags=cv2.INTER_NEAREST)
+
+    # Blur both pages so resampling and compression noise does not count as a change
+    diff = cv2.absdiff(cv2.GaussianBlur(reference, (5, 5), 0), cv2.GaussianBlur(warped, (5, 5), 0))
+    return diff > PIXEL_DIFF_THRESHOLD, covered > 0
+
+
+def _scaled_box(bbox, scale, shape):
+    """
+    Converts a full-resolution box to integer working-resolution coordinates, clamped to the page.
+    """
+    x1, y1, x2, y2 = (int(round(v * scale)) for v in bbox[:4])
+    return max(0, x1), max(0, y1), min(shape[1], max(x2, x1 + 1)), min(shape[0], max(y2, y1 + 1))
+
+
+def find_changed_items(changed, covered, results, scale):
+    """
+    Finds the items whose components changed, and measures the changes outside every item.
+
+    Args:
+        changed (numpy array): Boolean change mask in the working coordinates of the stored page.
+        covered (numpy array): Boolean mask of the pixels the new page covers; a component that
+                               the new page does not cover counts as changed.
+        results (list): Stored MenuItemResult of every item.
+        scale (float): Scale from full resolution to working resolution of the stored page.
+
+    Returns:
+        tuple: (set of indices in 'results' of the changed items, fraction of changed pixels outside every item).
+    """
+    changed_items = set()
+    inside = np.zeros(changed.shape, dtype=bool)
+    for position, result in enumerate(results):
+        x1, y1, x2, y2 = _scaled_box(result.bbox, scale, changed.shape)
+        inside[y1:y2, x1:x2] = True
+        for field in RESULT_FIELDS:
+            component = getattr(result, field)
+            if component is None:
+                continue
+            x1, y1, x2, y2 = _scaled_box(component.bbox, scale, changed.shape)
+            if (changed[y1:y2, x1:x2] | ~covered[y1:y2, x1:x2]).mean() > CHANGED_FRACTION:
+                changed_items.add(position)
+                break
+
+    # Margins uncovered by a shifted photo are not changes
+    outside = ~inside & covered
+    outside_fraction = float(changed[outside].mean()) if outside.any() else 0.0
+    return changed_items, outside_fraction
+
+
+def map_box(bbox, transform, shape):
+    """
+    Maps a box through a homography and returns the axis-aligned box around its corners.
+
+    Args:
+        bbox (tuple): Box (x1, y1, x2, y2).
+        transform (numpy array): 3x3 homography.
+        shape (tuple): Shape of the target image, used to clamp the box.
+
+    Returns:
+        tuple: The mapped box (x1, y1, x2, y2).
+    """
+    x1, y1, x2, y2 = bbox[:4]
+    corners = np.float32([[[x1, y1]], [[x2, y1]], [[x2, y2]], [[x1, y2]]])
+    mapped = cv2.perspectiveTransform(corners, transform).reshape(-1, 2)
+    return (
+        float(np.clip(mapped[:, 0].min(), 0, shape[1])), float(np.clip(mapped[:, 1].min(), 0, shape[0])),
+        float(np.clip(mapped[:, 0].max(), 0, shape[1])), float(np.clip(mapped[:, 1].max(), 0, shape[0]))
+    )
+
+
+def _map_result(result, transform, shape):
+    """
+    Moves a stored item, with its components, to the coordinates of the new page.
+    """
+    components = {}
+    for field in RESULT_FIELDS:
+        component = getattr(result, field)
+        components[field] = None if component is None else dataclasses.replace(component, bbox=map_box(component.bbox, transform, shape))
+    return dataclasses.replace(result, bbox=map_box(result.bbox, transform, shape), **components)
+
+
+def process_menu_incremental(image_source, menu_id, output_txt_path=None, state_dir=STATE_DIR, verbose=False, **options):
+    """
+    Processes a new version of a menu page, reading again only the items that changed since the stored version.
+
+    Args:
+        image_source (str | bytes | numpy array): The new page: path, encoded bytes or decoded BGR image.
+        menu_id (str): Identifier of the menu, e.g. the restaurant id; its state is stored under this name.
+        output_txt_path (str, optional): Path to save the extracted text. If None, no file is written.
+        state_dir (str): Directory of the stored states.
+        verbose (bool): If True, prints the text extracted for each item.
+        **options: Extra keyword arguments of process_menu_image (ocr_batch_size, fields, dedup, ...),
+                   used for full runs and, where they apply, for the items read again.
+
+    Returns:
+        list: One MenuItemResult per item, in reading order, with boxes in the coordinates of the new page.
+    """
+    with stage_timer("decode"):
+        image = load_image(image_source)
+    if image is None:
+        raise ValueError(f"Could not load image from {describe_source(image_source)}")
+    gray, scale = work_image(image)
+
+    def full_run(reason):
+        count("incremental_full_runs")
+        if verbose:
+            print(f"Full run of menu {menu_id}: {reason}")
+        results = process_menu_image(image, output_txt_path=output_txt_path, verbose=verbose, **options)
+        save_state(menu_id, gray, scale, results, state_dir)
+        return results
+
+    state = load_state(menu_id, state_dir)
+    if state is None:
+        return full_run("no stored version")
+    stored_gray, stored_scale, stored_results = state
+
+    # Align the new page onto the stored one and compare them
+    with stage_timer("align"):
+        homography = align_images(stored_gray, gray)
+    if homography is None:
+        return full_run("the pages do not align")
+    with stage_timer("diff"):
+        changed, outside_fraction = find_changed_items(*changed_pixels(stored_gray, gray, homography), stored_results, stored_scale)
+    if outside_fraction > OUTSIDE_CHANGED_FRACTION:
+        return full_run("the page changed outside the known items")
+    if len(changed) > MAX_CHANGED_ITEMS * max(len(stored_results), 1):
+        return full_run(f"{len(changed)} of {len(stored_results)} items changed")
+
+    # Full-resolution transform from the stored page to the new one
+    to_stored = np.diag([1 / stored_scale, 1 / stored_scale, 1]) @ homography @ np.diag([scale, scale, 1])
+    to_new = np.linalg.inv(to_stored)
+    results = [_map_result(result, to_new, image.shape) for result in stored_results]
+
+    # Read the changed items again at their new position
+    if changed:
+        changed_items = OrderedDict()
+        boxes = []
+        for position in sorted(changed):
+            result = results[position]
+            components = {field: None if getattr(result, field) is None else getattr(result, field).bbox for field in RESULT_FIELDS}
+            changed_items[result.bbox] = components
+            # Keep the stored detection confidences
+            boxes.append([*result.bbox, result.confidence or 0.0, ITEM_CLASS])
+            boxes.extend([*getattr(result, field).bbox, getattr(result, field).confidence or 0.0, _COMPONENT_CLASS_IDS[field]]
+                         for field in RESULT_FIELDS if getattr(result, field) is not None)
+
+        updated = extract_text_from_components(
+            image, changed_items, batch_size=options.get("ocr_batch_size"), bounding_boxes=boxes,
+            fields=options.get("fields", COMPONENT_FIELDS), dedup=options.get("dedup", False)
+        )
+        for position, result in zip(sorted(changed), updated):
+            results[position] = dataclasses.replace(result, index=results[position].index)
+
+    count("incremental_items_reused", len(results) - len(changed))
+    count("incremental_items_read", len(changed))
+    write_extracted_text(results, output_txt_path, verbose=verbose)
+    save_state(menu_id, gray, scale, results, state_dir)
+    return results
+
+
+# Example usage: process a menu, then a re-upload of it
+if __name__ == "__main__":
+    results = process_menu_incremental("./real_menu_card_images/carta2.jpg", "carta2", verbose=True)
+    results = process_menu_incremental("./real_menu_card_images/carta2.jpg", "carta2", "menu_text_output.txt", verbose=True)
@@ -0,0 +1,231 @@
+import re
+import json
+from dataclasses import dataclass, asdict
+from typing import Optional
+
+# Components of a menu item, in output order
+RESULT_FIELDS = ("title", "description", "price")
+
+# A number with optional thousands and decimal separators, e.g. '12', '12,50', '1.200,00'.
+# A space is only taken as a thousands separator before exactly three digits ('1 200,00'),
+# so two prices side by side ('3,50 8,00') or a split number ('12 50') are not merged
+_PRICE_PATTERN = re.compile(r"\d{1,3}(?:\s\d{3})+(?:[.,]\d+)?(?!\d)|\d[\d.,]*")
+
+
+@dataclass
+class ComponentResult:
+    """
+    Detected box and recognized text of one component (title, description or price) of an item.
+    """
+    __slots__ = ("bbox", "confidence", "text", "score")
+    bbox: tuple
+    confidence: Optional[float]
+    text: str
+    score: float
+
+
+@dataclass
+class MenuItemResult:
+    """
+    Everything extracted for one menu item: its box, its components and the parsed price.
+    """
+    __slots__ = ("index", "bbox", "confidence", "title", "description", "price", "price_value")
+    index: int
+    bbox: tuple
+    confidence: Optional[float]
+    title: Optional[ComponentResult]
+    description: Optional[ComponentResult]
+    price: Optional[ComponentResult]
+    price_value: Optional[float]
+
+    def text(self, field):
+        """
+        Returns the recognized text of a component, or an empty string if the item has none.
+
+        Args:
+            field (str): 'title', 'description' or 'price'.
+
+        Returns:
+            str: The recognized text.
+        """
+        component = getattr(self, field)
+        return component.text if component is not None else ""
+
+    def ocr_values(self):
+        """
+        Returns the recognized texts and OCR scores of the components, in RESULT_FIELDS order.
+
+        Returns:
+            tuple: ((title, description, price), (title_score, description_score, price_score)).
+        """
+        components = [getattr(self, field) for field in RESULT_FIELDS]
+        texts = tuple(component.text if component is not None else "" for component in components)
+        scores = tuple(component.score if component is not None else 0.0 for component in components)
+        return texts, scores
+
+    def to_line(self):
+        """
+        Formats the item as a line of the text output, e.g. '3: Paella Arroz con marisco -> 14,50€'.
+
+        Returns:
+            str: The formatted line, without trailing newline.
+        """
+        return f"{self.index}: {self.text('title')} {self.text('description')} -> {self.text('price')}€"
+
+    def to_dict(self):
+        """
+        Converts the item into plain Python types, ready to be serialized.
+
+        Returns:
+            dict: The item as a dictionary.
+        """
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Rebuilds an item from the output of to_dict (e.g. after a JSON round trip).
+
+        Args:
+            data (dict): The item as a dictionary.
+
+        Returns:
+            MenuItemResult: The item record.
+        """
+        components = {}
+        for field in RESULT_FIELDS:
+            component = data.get(field)
+            components[field] = None if component is None else ComponentResult(
+                tuple(component["bbox"]), component["confidence"], component["text"], component["score"]
+            )
+        return cls(data["index"], tuple(data["bbox"]), data["confidence"], components["title"],
+                   components["description"], components["price"], data["price_value"])
+
+
+def parse_price(text):
+    """
+    Parses the numeric value of a price text such as '12,50 €', '12.5' or '1.200,00€'.
+
+    Args:
+        text (str): The recognized price text.
+
+    Returns:
+        float: The price, or None if the text contains no number.
+    """
+    match = _PRICE_PATTERN.search(text or "")
+    if match is None:
+        return None
+    number = re.sub(r"\s", "", match.group()).rstrip(".,")
+
+    # The last separator is the decimal one when followed by 1 or 2 digits; others group thousands
+    last_separator = max(number.rfind("."), number.rfind(","))
+    if last_separator != -1 and len(number) - last_separator - 1 in (1, 2):
+        integer_part = re.sub(r"[.,]", "", number[:last_separator])
+        number = f"{integer_part}.{number[last_separator + 1:]}"
+    else:
+        number = re.sub(r"[.,]", "", number)
+
+    try:
+        return float(number)
+    except ValueError:
+        return None
+
+
+def make_item_result(index, item_bbox, components, texts, scores, confidences=None):
+    """
+    Builds the result record of one item.
+
+    Args:
+        index (int): Position of the item in reading order, starting at 1.
+        item_bbox (tuple): Bounding box (x1, y1, x2, y2) of the item.
+        components (dict): Component bounding boxes of the item, keyed by 'title', 'description' and 'price'.
+        texts (tuple): Recognized (title, description, price) texts.
+        scores (tuple): OCR scores of the (title, description, price) texts.
+        confidences (dict, optional): Detection confidence of each box, keyed by the box coordinates tuple.
+
+    Returns:
+        MenuItemResult: The item record.
+    """
+    confidences = confidences or {}
+
+    def as_bbox(bbox):
+        return tuple(float(v) for v in bbox)
+
+    fields = {}
+    for field, text, score in zip(RESULT_FIELDS, texts, scores):
+        bbox = components.get(field)
+        if bbox is None:
+            fields[field] = None
+            continue
+        fields[field] = ComponentResult(as_bbox(bbox), confidences.get(tuple(bbox[:4])), text, float(score))
+
+    price_text = fields["price"].text if fields["price"] is not None else ""
+    return MenuItemResult(
+        index, as_bbox(item_bbox), confidences.get(tuple(item_bbox[:4])),
+        fields["title"], fields["description"], fields["price"], parse_price(price_text)
+    )
+
+
+def box_confidences(bounding_boxes):
+    """
+    Maps each detected box to its detection confidence.
+
+    Args:
+        bounding_boxes (list): List of bounding boxes with format [x1, y1, x2, y2, confidence, class_id].
+
+    Returns:
+        dict: Confidence of each box, keyed by its (x1, y1, x2, y2) tuple.
+    """
+    return {tuple(box[:4]): float(box[4]) for box in bounding_boxes}
+
+
+def write_text(results, output_txt_path):
+    """
+    Writes the results as lines of text, in the '{i}: {dish} {desc} -> {price}€' format.
+
+    Args:
+        results (list): List of MenuItemResult.
+        output_txt_path (str): Path of the text file.
+    """
+    with open(output_txt_path, "w", encoding="utf-8") as f:
+        f.write("".join(f"{result.to_line()}\n" for result in results))
+
+
+def write_jsonl(results, output_path, append=False, **extra):
+    """
+    Writes the results as JSON Lines, one item per line, in a single write.
+
+    Args:
+        results (list): List of MenuItemResult.
+        output_path (str): Path of the JSON Lines file.
+        append (bool): If True, appends to the file instead of overwriting it.
+        **extra: Constant fields added to every line (e.g. page=3).
+    """
+    lines = [json.dumps({**extra, **result.to_dict()}, ensure_ascii=False) for result in results]
+    with open(output_path, "a" if append else "w", encoding="utf-8") as f:
+        f.write("".join(f"{line}\n" for line in lines))
+
+
+def write_parquet(results, output_path, **extra):
+    """
+    Writes the results as a Parquet table, one row per item with flattened component columns.
+    Requires pandas and a Parquet engine (pyarrow or fastparquet).
+
+    Args:
+        results (list): List of MenuItemResult.
+        output_path (str): Path of the Parquet file.
+        **extra: Constant columns added to every row (e.g. page=3).
+    """
+    import pandas as pd
+
+    rows = []
+    for result in results:
+        row = {**extra, "index": result.index, "bbox": list(result.bbox), "confidence": result.confidence, "price_value": result.price_value}
+        for field in RESULT_FIELDS:
+            component = getattr(result, field)
+            row[f"{field}_text"] = component.text if component is not None else None
+            row[f"{field}_score"] = component.score if component is not None else None
+            row[f"{field}_confidence"] = component.confidence if component is not None else None
+            row[f"{field}_bbox"] = list(component.bbox) if component is not None else None
+        rows.append(row)
+    pd.DataFrame(rows).to_parquet(output_path, index=False)
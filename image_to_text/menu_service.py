@@ -0,0 +1,357 @@
+"""
+Asyncio HTTP service that reads menu images, built only on the standard library.
+
+Requests that arrive within a short window are grouped into one micro-batch: the pages of
+the batch go through a single YOLO call and share the PaddleOCR recognizer batches, then
+each item is streamed back to its client as a JSON line as soon as it is read. A bounded
+queue of waiting requests applies backpressure: when it is full, new requests get a 503.
+
+Example:
+    python -m image_to_text.menu_service --port 8080 --batch-window 0.02
+    curl -N --data-binary @real_menu_card_images/carta1.jpg http://localhost:8080/menu
+"""
+import sys
+import os
+import json
+import time
+import asyncio
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from model_registry import warm_up, DEFAULT_YOLO_WEIGHTS
+from instrumentation import stage_timer, count, metrics, PrometheusFileExporter
+from image_to_text.utils_ocr import iter_pages_item_texts, OCR_OPTIONS, OCR_BATCH_SIZE, COMPONENT_FIELDS
+from image_to_text.menu_results import make_item_result, box_confidences
+from image_to_text.image_to_text import decode_page, detect_menu_items
+
+# Largest accepted request body, in bytes
+MAX_BODY_BYTES = 32 * 1024 * 1024
+
+# Seconds allowed to read the request line, headers and body
+READ_TIMEOUT = 30
+
+HTTP_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+                411: "Length Required", 413: "Payload Too Large", 500: "Internal Server Error",
+                503: "Service Unavailable"}
+
+# Marker sent to a request's event queue when all of its items have been sent
+_DONE = object()
+
+
+class _HttpError(Exception):
+    """
+    Raised while reading a request to answer it with an error status.
+    """
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class _Job:
+    """
+    One queued request: the image bytes and the queue of events streamed back to its client.
+    """
+    def __init__(self, data, loop):
+        self.data = data
+        self.loop = loop
+        self.events = asyncio.Queue()
+        self.enqueued = time.perf_counter()
+        # Set once the last event (an exception or _DONE) has been sent
+        self.closed = False
+
+    def emit(self, event):
+        """
+        Sends an event (a MenuItemResult, an exception or _DONE) from the worker thread to the client.
+        """
+        if event is _DONE or isinstance(event, Exception):
+            self.closed = True
+        self.loop.call_soon_threadsafe(self.events.put_nowait, event)
+
+    def fail(self, error):
+        """
+        Sends an error to the client, unless its response is already complete.
+        """
+        if not self.closed:
+            self.emit(error)
+
+
+class MenuService:
+    """
+    Micro-batching HTTP front end of the menu pipeline.
+
+    Endpoints:
+        POST /menu     Body: an encoded menu image. Streams one JSON line per item (chunked).
+        GET /health    Queue length and capacity.
+        GET /metrics   Pipeline metrics in the Prometheus text format.
+    """
+
+    def __init__(self, max_queue=32, max_batch=8, batch_window=0.02, ocr_batch_size=OCR_BATCH_SIZE,
+                 weights_path=DEFAULT_YOLO_WEIGHTS, detector_options=None, fields=COMPONENT_FIELDS, dedup=False):
+        """
+        Args:
+            max_queue (int): Maximum number of requests waiting for a batch; more are rejected with a 503.
+            max_batch (int): Maximum number of pages processed in one batch.
+            batch_window (float): Seconds to wait for more requests after the first one of a batch.
+            ocr_batch_size (int): Recognizer batch size, shared by the single-line crops of all the pages of a batch.
+            weights_path (str): Detector weights (.pt, or .onnx for ONNX Runtime).
+            detector_options (dict, optional): Arguments used to load the detector (see model_registry.get_yolo).
+            fields (tuple): Components to read (see iter_item_texts).
+            dedup (bool): If True, repeated crops are read once per page (see iter_item_texts).
+        """
+        self.max_queue = max_queue
+        self.max_batch = max_batch
+        self.batch_window = batch_window
+        self.ocr_batch_size = ocr_batch_size
+        self.weights_path = weights_path
+        self.detector_options = detector_options
+        self.fields = fields
+        self.dedup = dedup
+        self.queue = None
+        # The models are shared, so batches run one at a time in a single worker thread
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="menu-batch")
+
+    async def serve(self, host="127.0.0.1", port=8080):
+        """
+        Loads the models, then serves requests until cancelled.
+
+        Args:
+            host (str): Interface to listen on.
+            port (int): Port to listen on.
+        """
+        loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=self.max_queue)
+        await loop.run_in_executor(self.executor, lambda: warm_up(ocr_options=OCR_OPTIONS, yolo_weights=self.weights_path, yolo_options=self.detector_options))
+
+        batcher = asyncio.ensure_future(self._batch_loop())
+        server = await asyncio.start_server(self._handle_connection, host, port)
+        print(f"Menu service listening on http://{host}:{port}")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            batcher.cancel()
+            self.executor.shutdown(wait=False)
+
+    async def _batch_loop(self):
+        """
+        Groups queued requests into micro-batches and runs each batch in the worker thread.
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            jobs = [await self.queue.get()]
+            deadline = loop.time() + self.batch_window
+            while len(jobs) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    jobs.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            try:
+                await loop.run_in_executor(self.executor, self._run_batch, jobs)
+            except Exception as error:
+                # Fail the batch but keep serving, so later requests are not left waiting
+                for job in jobs:
+                    job.fail(error)
+
+    def _run_batch(self, jobs):
+        """
+        Processes the pages of a batch together and streams their items to each client.
+
+        Args:
+            jobs (list): The _Job of each page.
+        """
+        count("service_batches")
+        count("service_pages", len(jobs))
+        for job in jobs:
+            metrics.observe("queue_wait", time.perf_counter() - job.enqueued)
+        with stage_timer("service_batch"):
+            try:
+                self._process_batch(jobs)
+            except Exception as error:
+                # Every client still waiting gets the error instead of hanging
+                for job in jobs:
+                    job.fail(error)
+
+    def _process_batch(self, jobs):
+        """
+        Runs the pipeline on the pages of a batch; see _run_batch.
+        """
+        # Decode every page; pages that cannot be decoded fail on their own
+        pages = []
+        for job in jobs:
+            try:
+                pages.append((job, decode_page(job.data)))
+            except ValueError as error:
+                job.emit(error)
+        if not pages:
+            return
+
+        # One detector call for the whole batch, then organize, filter and sort each page
+        detected = detect_menu_items([image for _, image in pages], weights_path=self.weights_path)
+
+        # Items are yielded page by page, so a page is complete once the next one starts
+        next_open = 0
+        confidences = [box_confidences(boxes) for boxes, _ in detected]
+        for page, i, item_bbox, texts, scores in iter_pages_item_texts(
+                [(image, items) for (_, image), (_, items) in zip(pages, detected)],
+                batch_size=self.ocr_batch_size, fields=self.fields, dedup=self.dedup):
+            while next_open < page:
+                pages[next_open][0].emit(_DONE)
+                next_open += 1
+            pages[page][0].emit(make_item_result(i, item_bbox, detected[page][1][item_bbox], texts, scores, confidences[page]))
+
+        # Close the remaining pages, including those without items
+        for job, _ in pages[next_open:]:
+            job.emit(_DONE)
+
+    async def _handle_connection(self, reader, writer):
+        """
+        Answers one HTTP request, then closes the connection.
+        """
+        try:
+            try:
+                method, path, body = await asyncio.wait_for(self._read_request(reader), READ_TIMEOUT)
+            except _HttpError as error:
+                await self._send_json(writer, error.status, {"error": str(error)})
+                return
+            except (asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError):
+                await self._send_json(writer, 400, {"error": "Malformed or incomplete request"})
+                return
+
+            if path == "/health" and method == "GET":
+                await self._send_json(writer, 200, {"status": "ok", "queued": self.queue.qsize(), "capacity": self.max_queue})
+            elif path == "/metrics" and method == "GET":
+                await self._send(writer, 200, PrometheusFileExporter(None).render().encode(), "text/plain; version=0.0.4")
+            elif path == "/menu":
+                if method != "POST":
+                    await self._send_json(writer, 405, {"error": "Use POST with the image as the request body"})
+                else:
+                    await self._handle_menu(writer, body)
+            else:
+                await self._send_json(writer, 404, {"error": f"Unknown endpoint: {path}"})
+        except ConnectionError:
+            # The client went away; its items are dropped
+            pass
+        finally:
+            writer.close()
+
+    async def _handle_menu(self, writer, body):
+        """
+        Queues a menu image and streams its items back as JSON lines.
+        """
+        if not body:
+            await self._send_json(writer, 400, {"error": "Empty request body"})
+            return
+
+        job = _Job(body, asyncio.get_running_loop())
+        try:
+            self.queue.put_nowait(job)
+        except asyncio.QueueFull:
+            count("service_rejected")
+            await self._send_json(writer, 503, {"error": "Too many queued requests"}, {"Retry-After": "1"})
+            return
+
+        # Wait for the first event, so a page that fails before any item is an error status
+        event = await job.events.get()
+        if isinstance(event, Exception):
+            status = 400 if isinstance(event, ValueError) else 500
+            await self._send_json(writer, status, {"error": str(event)})
+            return
+
+        writer.write(self._head(200, "application/x-ndjson", {"Transfer-Encoding": "chunked"}))
+        while event is not _DONE:
+            if isinstance(event, Exception):
+                line = {"error": str(event)}
+            else:
+                line = event.to_dict()
+            data = (json.dumps(line, ensure_ascii=False) + "\n").encode("utf-8")
+            writer.write(f"{len(data):X}\r\n".encode() + data + b"\r\n")
+            await writer.drain()
+            if isinstance(event, Exception):
+                break
+            event = await job.events.get()
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+        count("service_requests")
+
+    async def _read_request(self, reader):
+        """
+        Reads the request line, headers and body of an HTTP/1.1 request.
+
+        Returns:
+            tuple: (method, path without the query string, body bytes).
+        """
+        request_line = await reader.readline()
+        method, target, _ = request_line.decode("latin-1").split()
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        body = b""
+        if method == "POST":
+            if "content-length" not in headers:
+                raise _HttpError(411, "Content-Length is required")
+            length = int(headers["content-length"])
+            if length > MAX_BODY_BYTES:
+                raise _HttpError(413, f"Images are limited to {MAX_BODY_BYTES} bytes")
+            body = await reader.readexactly(length)
+        return method, target.split("?", 1)[0], body
+
+    def _head(self, status, content_type, extra_headers=None):
+        """
+        Builds the status line and headers of a response.
+        """
+        headers = {"Content-Type": content_type, "Connection": "close", **(extra_headers or {})}
+        lines = [f"HTTP/1.1 {status} {HTTP_REASONS[status]}"] + [f"{name}: {value}" for name, value in headers.items()]
+        return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+    async def _send(self, writer, status, body, content_type, extra_headers=None):
+        """
+        Sends a complete (non-streamed) response.
+        """
+        writer.write(self._head(status, content_type, {"Content-Length": str(len(body)), **(extra_headers or {})}) + body)
+        await writer.drain()
+
+    async def _send_json(self, writer, status, value, extra_headers=None):
+        """
+        Sends a JSON response.
+        """
+        await self._send(writer, status, json.dumps(value).encode("utf-8"), "application/json", extra_headers)
+
+
+def serve(host="127.0.0.1", port=8080, **options):
+    """
+    Runs the menu service until interrupted.
+
+    Args:
+        host (str): Interface to listen on.
+        port (int): Port to listen on.
+        **options: MenuService arguments (max_queue, max_batch, batch_window, ocr_batch_size, ...).
+    """
+    try:
+        asyncio.run(MenuService(**options).serve(host, port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the menu OCR pipeline over HTTP.")
+    parser.add_argument("--host", default="127.0.0.1", help="Interface to listen on")
+    parser.add_argument("--port", type=int, default=8080, help="Port to listen on")
+    parser.add_argument("--max-queue", type=int, default=32, help="Requests waiting for a batch before new ones get a 503")
+    parser.add_argument("--max-batch", type=int, default=8, help="Maximum number of pages per batch")
+    parser.add_argument("--batch-window", type=float, default=0.02, help="Seconds to wait for more requests to batch")
+    parser.add_argument("--ocr-batch-size", type=int, default=OCR_BATCH_SIZE, help="Recognizer batch size")
+    parser.add_argument("--weights", default=DEFAULT_YOLO_WEIGHTS, help="Detector weights (.pt, or .onnx for ONNX Runtime)")
+    parser.add_argument("--dedup", action="store_true", help="Read repeated crops once per page")
+    args = parser.parse_args()
+
+    serve(args.host, args.port, max_queue=args.max_queue, max_batch=args.max_batch, batch_window=args.batch_window,
+          ocr_batch_size=args.ocr_batch_size, weights_path=args.weights, dedup=args.dedup)
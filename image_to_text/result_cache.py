@@ -0,0 +1,224 @@
+import os
+import json
+import hashlib
+import threading
+import numpy as np
+
+# Stages whose results are cached independently
+CACHE_STAGES = ("detection", "ocr")
+
+# Weights fingerprints, keyed by (path, size, modification time), so each weights file is hashed once
+_weights_fingerprints = {}
+
+
+def hash_bytes(data):
+    """
+    Returns the SHA-256 hex digest of a bytes-like object.
+
+    Args:
+        data (bytes): The data to hash.
+
+    Returns:
+        str: The hex digest.
+    """
+    return hashlib.sha256(data).hexdigest()
+
+
+def image_digest(source):
+    """
+    Returns a content hash of an image given as encoded bytes or a decoded array.
+
+    Args:
+        source (bytes | numpy array): The encoded image bytes, or the decoded image.
+
+    Returns:
+        str: The hex digest.
+    """
+    if isinstance(source, np.ndarray):
+        digest = hashlib.sha256(str(source.shape).encode())
+        digest.update(np.ascontiguousarray(source).data)
+        return digest.hexdigest()
+    return hash_bytes(source)
+
+
+def weights_fingerprint(weights_path):
+    """
+    Returns a content hash of a model weights file, computed once per file version.
+
+    Args:
+        weights_path (str): Path to the weights file.
+
+    Returns:
+        str: The hex digest.
+    """
+    stat = os.stat(weights_path)
+    key = (os.path.abspath(weights_path), stat.st_size, stat.st_mtime_ns)
+    if key not in _weights_fingerprints:
+        digest = hashlib.sha256()
+        with open(weights_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+        _weights_fingerprints[key] = digest.hexdigest()
+    return _weights_fingerprints[key]
+
+
+def detection_cache_key(image_hash, weights_path, detect_scale=1, tiling=None):
+    """
+    Builds the cache key of the detected boxes of an image.
+
+    Args:
+        image_hash (str): Content hash of the image.
+        weights_path (str): Path to the YOLO weights used for detection.
+        detect_scale (int): Downscaling factor of the detector input.
+        tiling (list, optional): [tile_size, tile_overlap] of tiled detection, or None for whole-page detection.
+
+    Returns:
+        str: The cache key.
+    """
+    key = [image_hash, weights_fingerprint(weights_path), detect_scale]
+    # Whole-page keys keep their previous form, so existing entries stay valid
+    if tiling is not None:
+        key.append(tiling)
+    return hash_bytes(json.dumps(key).encode())
+
+
+def ocr_cache_key(image_hash, sorted_items, ocr_options, batch_size=None, fields=None, preprocessing=None):
+    """
+    Builds the cache key of the OCR text of an image. It depends on the boxes being read,
+    not on how they were detected, so a detector change that yields the same boxes keeps the entry.
+
+    Args:
+        image_hash (str): Content hash of the image.
+        sorted_items (OrderedDict): Ordered dictionary with item bounding boxes as keys and component bboxes as values.
+        ocr_options (dict): PaddleOCR configuration.
+        batch_size (int, optional): OCR batch size, since the batched path reads differently.
+        fields (tuple, optional): Components that were read.
+        preprocessing (dict, optional): Crop preprocessing settings (e.g. the target text-line height, or whether repeated crops are deduplicated).
+
+    Returns:
+        str: The cache key.
+    """
+    items = [
+        [[float(v) for v in item_bbox], {field: None if bbox is None else [float(v) for v in bbox] for field, bbox in components.items()}]
+        for item_bbox, components in sorted_items.items()
+    ]
+    return hash_bytes(json.dumps([image_hash, items, ocr_options, batch_size, list(fields or []), preprocessing or {}], sort_keys=True).encode())
+
+
+class ResultCache:
+    """
+    On-disk, content-addressed cache of the detection and OCR results of menu images.
+
+    Each entry is a JSON file under '<cache_dir>/<stage>/'. Reading an entry refreshes its
+    modification time, and once the cache grows past max_bytes the least recently used
+    entries are deleted. Hits and misses are counted per stage.
+    """
+
+    def __init__(self, cache_dir=".menu_cache", max_bytes=256 * 1024 * 1024):
+        """
+        Args:
+            cache_dir (str): Directory where the cache entries are stored.
+            max_bytes (int): Maximum total size of the cache entries, in bytes.
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = {stage: 0 for stage in CACHE_STAGES}
+        self.misses = {stage: 0 for stage in CACHE_STAGES}
+        self._lock = threading.Lock()
+
+        for stage in CACHE_STAGES:
+            os.makedirs(os.path.join(cache_dir, stage), exist_ok=True)
+        self._size = sum(size for _, _, size in self._entries())
+
+    def _path(self, stage, key):
+        return os.path.join(self.cache_dir, stage, f"{key}.json")
+
+    def _entries(self):
+        """
+        Lists the cache entries as (path, modification time, size) tuples.
+        """
+        entries = []
+        for stage in CACHE_STAGES:
+            stage_dir = os.path.join(self.cache_dir, stage)
+            for entry in os.scandir(stage_dir):
+                if entry.name.endswith(".json"):
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    entries.append((entry.path, stat.st_mtime_ns, stat.st_size))
+        return entries
+
+    def get(self, stage, key):
+        """
+        Returns the cached value of a stage, or None on a miss.
+
+        Args:
+            stage (str): 'detection' or 'ocr'.
+            key (str): The cache key (see detection_cache_key and ocr_cache_key).
+
+        Returns:
+            object: The cached JSON value, or None.
+        """
+        path = self._path(stage, key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                value = json.load(f)
+            # Mark the entry as recently used
+            os.utime(path)
+        except (FileNotFoundError, json.JSONDecodeError):
+            with self._lock:
+                self.misses[stage] += 1
+            return None
+
+        with self._lock:
+            self.hits[stage] += 1
+        return value
+
+    def put(self, stage, key, value):
+        """
+        Stores a JSON-serializable value and evicts old entries if the cache is too big.
+
+        Args:
+            stage (str): 'detection' or 'ocr'.
+            key (str): The cache key.
+            value (object): The value to store.
+        """
+        path = self._path(stage, key)
+        data = json.dumps(value).encode("utf-8")
+
+        # Write to a temporary file first so readers never see a partial entry
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            self._size += len(data)
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        """
+        Deletes the least recently used entries until the cache fits in max_bytes.
+        """
+        entries = sorted(self._entries(), key=lambda entry: entry[1])
+        self._size = sum(size for _, _, size in entries)
+        for path, _, size in entries:
+            if self._size <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self._size -= size
+
+    def stats(self):
+        """
+        Returns the hit and miss counters of each stage and the current cache size.
+
+        Returns:
+            dict: {'hits': {...}, 'misses': {...}, 'size_bytes': int}.
+        """
+        with self._lock:
+            return {"hits": dict(self.hits), "misses": dict(self.misses), "size_bytes": self._size}
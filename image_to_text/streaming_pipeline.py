@@ -0,0 +1,152 @@
+import sys
+import os
+import threading
+import queue
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from model_registry import DEFAULT_YOLO_WEIGHTS
+from image_to_text.utils_ocr import iter_item_texts, COMPONENT_FIELDS
+from image_to_text.image_to_text import decode_page, detect_menu_items
+from image_to_text.menu_results import make_item_result, box_confidences
+
+# Marker sent downstream when a stage has no more pages
+_END = object()
+
+# How often (in seconds) a blocked stage checks whether the consumer went away
+_POLL_INTERVAL = 0.1
+
+
+class _StageError:
+    """
+    Wraps an exception raised inside a stage so it can be re-raised by the consumer.
+    """
+    def __init__(self, error):
+        self.error = error
+
+
+def _put(out_queue, value, stop_event):
+    """
+    Puts a value in a bounded queue, giving up if the pipeline is being stopped.
+
+    Args:
+        out_queue (queue.Queue): Queue of the next stage.
+        value (object): Value to send.
+        stop_event (threading.Event): Set when the consumer stops reading results.
+
+    Returns:
+        bool: True if the value was queued, False if the pipeline was stopped.
+    """
+    while not stop_event.is_set():
+        try:
+            out_queue.put(value, timeout=_POLL_INTERVAL)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _run_stage(work, in_queue, out_queue, stop_event):
+    """
+    Runs a stage in its own thread: reads pages from in_queue, applies 'work' and sends the
+    results to out_queue. Errors and the end marker are forwarded downstream.
+
+    Args:
+        work (callable): Function applied to each page; it returns an iterable of values to send.
+        in_queue (queue.Queue): Queue of the previous stage.
+        out_queue (queue.Queue): Queue of the next stage.
+        stop_event (threading.Event): Set when the consumer stops reading results.
+    """
+    while not stop_event.is_set():
+        try:
+            page = in_queue.get(timeout=_POLL_INTERVAL)
+        except queue.Empty:
+            continue
+
+        if page is _END or isinstance(page, _StageError):
+            _put(out_queue, page, stop_event)
+            return
+
+        try:
+            for value in work(page):
+                if not _put(out_queue, value, stop_event):
+                    return
+        except Exception as error:
+            _put(out_queue, _StageError(error), stop_event)
+            return
+
+
+def stream_menu_images(image_paths, queue_size=2, ocr_batch_size=None, fields=COMPONENT_FIELDS, dedup=False, weights_path=DEFAULT_YOLO_WEIGHTS):
+    """
+    Processes menu pages as a pipeline of concurrent stages and yields each item as soon as it is read.
+
+    Image decoding, YOLO detection (plus organizing, filtering and sorting the boxes) and OCR
+    run in separate threads connected by bounded queues, so consecutive pages overlap: while
+    one page is being read by the OCR, the next one is already being detected and decoded.
+
+    Args:
+        image_paths (iterable): Paths (or encoded bytes) of the menu pages, in page order.
+        queue_size (int): Maximum number of pages waiting between two stages.
+        ocr_batch_size (int, optional): Passed on to iter_item_texts.
+        fields (tuple): Components to read (see iter_item_texts).
+        dedup (bool): If True, repeated crops are read once per page (see iter_item_texts).
+        weights_path (str): Detector weights; a '.onnx' model runs on ONNX Runtime.
+
+    Yields:
+        tuple: (page_index, image_path, MenuItemResult), in page order and reading order
+               within each page. Page indices start at 1.
+    """
+    stop_event = threading.Event()
+    path_queue = queue.Queue(maxsize=queue_size)
+    decoded_queue = queue.Queue(maxsize=queue_size)
+    detected_queue = queue.Queue(maxsize=queue_size)
+    result_queue = queue.Queue(maxsize=queue_size)
+
+    def feed():
+        try:
+            for page in enumerate(image_paths, start=1):
+                if not _put(path_queue, page, stop_event):
+                    return
+        except Exception as error:
+            # e.g. a generator of pages that fails; the consumer re-raises the error
+            _put(path_queue, _StageError(error), stop_event)
+            return
+        _put(path_queue, _END, stop_event)
+
+    def decode(page):
+        page_index, image_path = page
+        yield page_index, image_path, decode_page(image_path)
+
+    def detect(page):
+        page_index, image_path, image = page
+        # Detect, then organize, filter and sort the items of the page
+        boxes, sorted_items = detect_menu_items([image], weights_path=weights_path)[0]
+        yield page_index, image_path, image, boxes, sorted_items
+
+    def recognize(page):
+        page_index, image_path, image, boxes, sorted_items = page
+        confidences = box_confidences(boxes)
+        for item_index, item_bbox, texts, scores in iter_item_texts(image, sorted_items, batch_size=ocr_batch_size, fields=fields, dedup=dedup):
+            yield page_index, image_path, make_item_result(item_index, item_bbox, sorted_items[item_bbox], texts, scores, confidences)
+
+    threads = [
+        threading.Thread(target=feed, daemon=True),
+        threading.Thread(target=_run_stage, args=(decode, path_queue, decoded_queue, stop_event), daemon=True),
+        threading.Thread(target=_run_stage, args=(detect, decoded_queue, detected_queue, stop_event), daemon=True),
+        threading.Thread(target=_run_stage, args=(recognize, detected_queue, result_queue, stop_event), daemon=True)
+    ]
+    for thread in threads:
+        thread.start()
+
+    try:
+        while True:
+            result = result_queue.get()
+            if result is _END:
+                break
+            if isinstance(result, _StageError):
+                raise result.error
+            yield result
+    finally:
+        # Unblock every stage if the consumer stops early or an error was raised
+        stop_event.set()
+        for thread in threads:
+            thread.join()
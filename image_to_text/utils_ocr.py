@@ -1,9 +1,52 @@
-from paddleocr import PaddleOCR
 import cv2
 from collections import OrderedDict
 import numpy as np
 import os
-ocr = PaddleOCR(use_angle_cls = True, lang='es')
+import threading
+from model_registry import get_ocr
+from image_io import load_image, describe_source
+from instrumentation import stage_timer, count
+from yolov8_menu_card.layout import reading_order
+from image_to_text.menu_results import make_item_result, box_confidences, write_text
+
+# Number of crops sent to the text recognizer in a single batch
+OCR_BATCH_SIZE = 16
+
+# PaddleOCR configuration; the engine itself is loaded on first use by the model registry
+OCR_OPTIONS = {"lang": "es", "use_angle_cls": True, "rec_batch_num": OCR_BATCH_SIZE}
+
+# Components extracted from each item, in output order
+COMPONENT_FIELDS = ("title", "description", "price")
+
+# Padding (in pixels) kept around each component crop
+COMPONENT_PADDING = {"title": 5, "description": 0, "price": 0}
+
+# Components whose YOLO box holds a single line of text, so their line count is not estimated
+SINGLE_LINE_FIELDS = ("title", "price")
+
+# Size (width, height) of the grid compared by crop_fingerprint; wide enough to tell '12,50' from '12,90'
+FINGERPRINT_SIZE = (64, 16)
+
+# Height (in pixels) of one text line in the crops given to the recognizer, which reads 48-pixel-high lines
+TARGET_LINE_HEIGHT = 48
+
+# Crops whose scale would change by less than this fraction are not resized
+RESIZE_TOLERANCE = 0.1
+
+# Largest upscale applied to a crop, so tiny noisy boxes are not blown up
+MAX_UPSCALE = 4.0
+
+# Scale factor of the previous fixed resize, used as the baseline of the pixel savings counters
+BASELINE_SCALE = 1.5
+
+# Recognizer-only results scoring below this are read again with a full OCR pass
+CASCADE_MIN_SCORE = 0.85
+
+# Single-line components wider than this many times their height are not checked for wrapped lines
+MULTI_LINE_ASPECT = 4.0
+
+# Per-thread scratch buffer for the grayscale conversion of crops that are resized afterwards
+_buffers = threading.local()
 
 def filter_items_with_price(organized_items):
     """
@@ -25,114 +68,434 @@ def filter_items_with_price(organized_items):
 
 def sort_item_bboxes_by_position(items):
     """
-    Sorts item bounding boxes first by the left (x1) position and then by top (y1) position.
+    Sorts item bounding boxes in reading order: column by column from left to right, and top to bottom within each column.
+
+    Items are grouped into columns by the overlap of their horizontal extents (see
+    yolov8_menu_card.layout.reading_order), so columns of skewed photos, whose x positions
+    drift across the page, are still read as one column.
 
     Args:
         items (dict): Dictionary where each key is an item bounding box (tuple of x1, y1, x2, y2),
                       and the value is a dictionary of contained components.
 
     Returns:
-        OrderedDict: Dictionary with item bounding boxes sorted by the left-to-right and top-to-bottom criteria.
-    """
-    # Define the sorting key with two criteria:
-    # 1. Left (x1) position
-    # 2. Top (y1) position within a tolerance of 10 pixels for x1
-    sorted_items = OrderedDict(
-        sorted(
-            items.items(),
-            key=lambda item: (round(item[0][0] / 10) * 10, item[0][1])
-        )
-    )
+        OrderedDict: Dictionary with item bounding boxes sorted in reading order.
+    """
+    item_bboxes = list(items)
+    order = reading_order([bbox[:4] for bbox in item_bboxes])
+    sorted_items = OrderedDict((item_bboxes[i], items[item_bboxes[i]]) for i in order)
     
     return sorted_items
 
-def extract_text_from_components(image_path, sorted_items, output_txt_path="extracted_text.txt", debug_dir="debug_images"):
+def crop_component(image, bbox, padding=0):
+    """
+    Crops a component bounding box out of the image, clamped to the image borders.
+
+    Args:
+        image (numpy array): The full menu image.
+        bbox (tuple): Bounding box (x1, y1, x2, y2) of the component.
+        padding (int): Extra pixels to keep around the bounding box.
+
+    Returns:
+        numpy array: View of the image covering the (padded) bounding box.
+    """
+    x1, y1, x2, y2 = map(int, bbox)
+    return image[max(0, y1 - padding):min(image.shape[0], y2 + padding), max(0, x1 - padding):min(image.shape[1], x2 + padding)]
+
+def collect_component_crops(image, sorted_items, fields=COMPONENT_FIELDS):
+    """
+    Collects the resized grayscale crop of every component of every item in the page.
+
+    Args:
+        image (numpy array): The full menu image.
+        sorted_items (OrderedDict): Ordered dictionary with item bounding boxes as keys and component bboxes as values.
+        fields (tuple): Components to collect; the others are skipped.
+
+    Returns:
+        list: A list of (item_index, field, crop, lines) tuples, where item_index starts at 1,
+              field is one of 'title', 'description' or 'price' and lines is the estimated
+              number of text lines of the crop (see adaptive_resize).
+    """
+    crops = []
+    for i, (item_bbox, components) in enumerate(sorted_items.items(), start=1):
+        for field in COMPONENT_FIELDS:
+            if field in fields and components.get(field) is not None:
+                crop = crop_component(image, components[field], padding=COMPONENT_PADDING[field])
+
+                # Bring the text lines to the height expected by the recognizer
+                with stage_timer("resize"):
+                    crops.append((i, field, *adaptive_resize(crop, single_line=field in SINGLE_LINE_FIELDS)))
+    count("crops", len(crops))
+    return crops
+
+def recognize_crops_batched(crops, batch_size=OCR_BATCH_SIZE):
+    """
+    Runs text recognition over a list of single-line crops in size-bucketed batches.
+
+    Text detection and angle classification are skipped, since the crops are already
+    tight YOLO boxes around one line of text. Crops are sorted by aspect ratio so each
+    batch pads its images to a similar width.
+
+    Args:
+        crops (list): List of crops (numpy arrays, grayscale or BGR).
+        batch_size (int): Number of crops sent to the recognizer in one call.
+
+    Returns:
+        list: A list of (text, score) tuples aligned with the input crops.
+    """
+    results = [("", 0.0)] * len(crops)
+
+    # Bucket crops of similar width/height ratio together
+    order = sorted(range(len(crops)), key=lambda idx: crops[idx].shape[1] / max(crops[idx].shape[0], 1))
+
+    for start in range(0, len(order), batch_size):
+        batch_indices = order[start:start + batch_size]
+        batch = [to_bgr(crops[idx]) for idx in batch_indices]
+
+        # With det=False the recognizer accepts a list of images and returns one result per image
+        ocr = get_ocr(**OCR_OPTIONS)
+        with stage_timer("ocr_batch"):
+            recognized = ocr.ocr(batch, det=False, cls=False)
+        count("ocr_calls")
+        if not recognized or not recognized[0]:
+            continue
+        for idx, (text, score) in zip(batch_indices, recognized[0]):
+            results[idx] = (text, float(score))
+
+    return results
+
+def crop_fingerprint(crop):
+    """
+    Computes a perceptual difference hash (dHash) of a crop, used to find repeated labels in a page.
+
+    The crop is shrunk to a FINGERPRINT_SIZE grid and each cell is compared with its right
+    neighbour. Fingerprints are compared for equality, so only labels repeated pixel for pixel
+    match, as in digitally rendered menus and PDF pages; the same label photographed twice
+    usually differs by sensor noise and is read twice. The aspect ratio is part of the
+    fingerprint, so labels of different lengths never match.
+
+    Args:
+        crop (numpy array): Grayscale or BGR crop.
+
+    Returns:
+        bytes: The fingerprint.
+    """
+    gray = crop if crop.ndim == 2 else cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY)
+    width, height = FINGERPRINT_SIZE
+    small = cv2.resize(gray, (width + 1, height), interpolation=cv2.INTER_AREA)
+    bits = np.packbits(small[:, 1:] > small[:, :-1])
+    aspect_bucket = round(2 * crop.shape[1] / max(crop.shape[0], 1))
+    return aspect_bucket.to_bytes(4, "little") + bits.tobytes()
+
+def iter_item_texts(image, sorted_items, batch_size=None, fields=COMPONENT_FIELDS, dedup=False):
+    """
+    Recognizes the components of each item and yields the texts item by item.
+
+    Args:
+        image (numpy array): The full menu image.
+        sorted_items (OrderedDict): Ordered dictionary with item bounding boxes as keys and component bboxes as values.
+        batch_size (int, optional): If set, the recognizer-only first pass (see recognize_cascade) of
+                                    the whole page runs in batches of this size. If None, each crop
+                                    goes through the cascade on its own, item by item.
+        fields (tuple): Components to read, e.g. ("title", "price"). The others are not read and
+                        come back with an empty text.
+        dedup (bool): If True, crops with the same fingerprint (see crop_fingerprint) and component
+                      type are recognized only once per page, e.g. a 'Consultar' price repeated on
+                      every item.
+
+    Yields:
+        tuple: (item_index, item_bbox, (dish_name, description, price), (title_score, description_score, price_score)),
+               with item_index starting at 1. Missing components have an empty text and a score of 0.
+    """
+    for _, i, item_bbox, texts, scores in iter_pages_item_texts([(image, sorted_items)], batch_size=batch_size, fields=fields, dedup=dedup):
+        yield i, item_bbox, texts, scores
+
+def iter_pages_item_texts(pages, batch_size=None, fields=COMPONENT_FIELDS, dedup=False):
+    """
+    Recognizes the components of the items of several pages and yields the texts item by item.
+
+    With batch_size set, the single-line crops of all the pages share the same recognizer
+    batches, so pages processed together cost fewer OCR calls than pages processed one by one.
+
+    Args:
+        pages (list): List of (image, sorted_items) tuples, one per page (see iter_item_texts).
+        batch_size (int, optional): Batch size of the single-line components (see iter_item_texts).
+        fields (tuple): Components to read (see iter_item_texts).
+        dedup (bool): If True, repeated crops are recognized once per page (see iter_item_texts).
+
+    Yields:
+        tuple: (page_position, item_index, item_bbox, texts, scores), page by page in input order,
+               where page_position is the index of the page in 'pages' and the rest is as in iter_item_texts.
+    """
+    crops = []
+    # Map each repeated crop to the first crop of the page with the same fingerprint, which is read instead
+    duplicate_of = {}
+    for page, (image, sorted_items) in enumerate(pages):
+        page_crops = collect_component_crops(image, sorted_items, fields=fields)
+        if dedup:
+            first_seen = {}
+            unique_crops = []
+            for i, field, crop, lines in page_crops:
+                key = (field, crop_fingerprint(crop))
+                if key in first_seen:
+                    duplicate_of[(page, i, field)] = (page, *first_seen[key])
+                else:
+                    first_seen[key] = (i, field)
+                    unique_crops.append((i, field, crop, lines))
+            count("ocr_dedup_skipped", len(page_crops) - len(unique_crops))
+            page_crops = unique_crops
+        crops.extend((page, i, field, crop, lines) for i, field, crop, lines in page_crops)
+
+    # Map (page_position, item_index, field) -> recognized (text, score)
+    recognized = {}
+    if batch_size:
+        # First pass of the cascade for the whole batch of pages; multi-line crops go straight to a full pass.
+        # Empty crops (e.g. a box less than a pixel wide) cannot be converted and are read as empty text
+        first_pass = [(page, i, field, crop) for page, i, field, crop, lines in crops if lines == 1 and crop.size > 0]
+        batch_results = recognize_crops_batched([crop for _, _, _, crop in first_pass], batch_size=batch_size)
+        for (page, i, field, _), result in zip(first_pass, batch_results):
+            recognized[(page, i, field)] = result
+
+    # Group the crops by item so each item can be yielded as soon as it is done
+    crops_by_item = {}
+    for page, i, field, crop, lines in crops:
+        crops_by_item.setdefault((page, i), []).append((field, crop, lines))
+
+    ocr = get_ocr(**OCR_OPTIONS)
+    for page, (_, sorted_items) in enumerate(pages):
+        for i, item_bbox in enumerate(sorted_items, start=1):
+            for field, crop, lines in crops_by_item.get((page, i), []):
+                recognized[(page, i, field)] = recognize_cascade(ocr, crop, lines, recognized.get((page, i, field)))
+
+            # Duplicates always point to an earlier (or the same) item, which has been read already
+            item_results = [recognized.get(duplicate_of.get((page, i, field), (page, i, field)), ("", 0.0)) for field in COMPONENT_FIELDS]
+            yield page, i, item_bbox, tuple(text for text, _ in item_results), tuple(score for _, score in item_results)
+
+def recognize_cascade(ocr, crop, lines=1, first_pass=None):
+    """
+    Reads a crop with the cheapest OCR path that gives a confident result.
+
+    Single-line crops are first read by the recognizer alone, without text detection or angle
+    classification. Only crops that hold several lines, or whose result
+    scores below CASCADE_MIN_SCORE, are read again with a full pass (detection, angle
+    classification and recognition), which keeps every line. The 'ocr_cascade_fast',
+    'ocr_cascade_low_confidence' and 'ocr_cascade_multi_line' counters record which path was taken.
+
+    Args:
+        ocr (PaddleOCR): The OCR engine.
+        crop (numpy array): Grayscale crop returned by adaptive_resize.
+        lines (int): Estimated number of text lines of the crop, as returned by adaptive_resize.
+        first_pass (tuple, optional): (text, score) of a recognizer-only pass already run on the
+                                      crop (e.g. in a batch). If None and the crop is single-line,
+                                      the pass is run here.
+
+    Returns:
+        tuple: (text, score).
     """
-    Extracts text from each component in the sorted bounding boxes and saves it to a text file.
+    if crop.size == 0:
+        return "", 0.0
+
+    if lines > 1:
+        count("ocr_cascade_multi_line")
+    else:
+        if first_pass is None:
+            with stage_timer("ocr"):
+                recognized = ocr.ocr([to_bgr(crop)], det=False, cls=False)
+            count("ocr_calls")
+            first_pass = (recognized[0][0][0], float(recognized[0][0][1])) if recognized and recognized[0] else ("", 0.0)
+        if first_pass[1] >= CASCADE_MIN_SCORE:
+            count("ocr_cascade_fast")
+            return first_pass
+        count("ocr_cascade_low_confidence")
+
+    # Full pass: text detection, angle classification and recognition of every line
+    with stage_timer("ocr"):
+        result = all_lines_result(ocr.ocr(crop, cls=True))
+    count("ocr_calls")
+
+    # Keep the first pass if the full pass found nothing
+    if first_pass is not None and not result[0]:
+        return first_pass
+    return result
+
+def extract_text_from_components(image_source, sorted_items, output_txt_path=None, debug_dir="debug_images", batch_size=None, bounding_boxes=None, verbose=False, fields=COMPONENT_FIELDS, dedup=False):
+    """
+    Extracts text from each component in the sorted bounding boxes.
     
     Args:
-        image_path (str): Path to the image file.
+        image_source (str | bytes | numpy array): Path to the image file, its encoded bytes, or the
+                                                  already decoded BGR image. Crops are views into it.
         sorted_items (OrderedDict): Ordered dictionary with item bounding boxes as keys and component bboxes as values.
-        output_txt_path (str): Path to save the extracted text.
+        output_txt_path (str, optional): Path to save the extracted text. If None, no file is written.
         debug_dir (str): Directory to save debug images of each component being processed.
+        batch_size (int, optional): If set, the recognizer-only first pass (see recognize_cascade) of
+                                    the whole page runs in batches of this size. If None, each crop
+                                    goes through the cascade on its own, item by item.
+        bounding_boxes (list, optional): The detected boxes [x1, y1, x2, y2, confidence, class_id], used
+                                         to fill in the detection confidences of the results.
+        verbose (bool): If True, prints the text extracted for each item.
+        fields (tuple): Components to read, e.g. ("title", "price") (see iter_item_texts).
+        dedup (bool): If True, repeated crops are recognized once per page (see iter_item_texts).
+
+    Returns:
+        list: One MenuItemResult per item, in the order of sorted_items.
     """
     # Load image
-    image = cv2.imread(image_path)
+    image = load_image(image_source)
    
     if image is None:
-        print(f"Error: Could not load image from path {image_path}")
-        return
-    
-  
-
-    # Open file to write the extracted text
-    with open(output_txt_path, "w", encoding="utf-8") as f:
-        for i, (item_bbox, components) in enumerate(sorted_items.items(), start=1):
-            # Initialize text variables for each component
-            dish_name, description, price = "", "", ""
-
-            # Extract text for each component, if present
-            if components.get("title") is not None:
-                title_bbox = components["title"]
-                x1, y1, x2, y2 = map(int, title_bbox)
-                title_img = image[max(0, y1 - 5):min(image.shape[0], y2 + 5), max(0, x1 - 5):min(image.shape[1], x2 + 5)]
-                
-                # Increase resolution before OCR
-                title_img = increase_resolution(title_img)
-                
-                # Perform OCR
-                title_text = ocr.ocr(title_img, cls=True)
-                if title_text and title_text[0] and title_text[0][0] and title_text[0][0][1]:
-                    dish_name = title_text[0][0][1][0]
-
-            if components.get("description") is not None:
-                description_bbox = components["description"]
-                x1, y1, x2, y2 = map(int, description_bbox)
-                description_img = image[y1:y2, x1:x2]
-                
-                # Increase resolution before OCR
-                description_img = increase_resolution(description_img)
-                
-                # Perform OCR
-                description_text = ocr.ocr(description_img, cls=True)
-                if description_text and description_text[0] and description_text[0][0] and description_text[0][0][1]:
-                    description = description_text[0][0][1][0]
-
-            if components.get("price") is not None:
-                price_bbox = components["price"]
-                x1, y1, x2, y2 = map(int, price_bbox)
-                price_img = image[y1:y2, x1:x2]
-                
-                # Increase resolution before OCR
-                price_img = increase_resolution(price_img)
-                
-                # Perform OCR
-                price_text = ocr.ocr(price_img, cls=True)
-                if price_text and price_text[0] and price_text[0][0] and price_text[0][0][1]:
-                    price = price_text[0][0][1][0]
-
-            # Write to file
-            f.write(f"{i}: {dish_name} {description} -> {price}€\n")
-            print(f"Extracted text for item {i}: {dish_name} {description} -> {price}€")
-
-    print(f"Extraction complete. Results saved to {output_txt_path}")
-
-
-def increase_resolution(image, scale_factor=1.5):
-    """
-    Converts the image to grayscale and increases its resolution by the specified scale factor.
+        print(f"Error: Could not load image from {describe_source(image_source)}")
+        return []
     
+    confidences = box_confidences(bounding_boxes or [])
+    results = [
+        make_item_result(i, item_bbox, sorted_items[item_bbox], texts, scores, confidences)
+        for i, item_bbox, texts, scores in iter_item_texts(image, sorted_items, batch_size=batch_size, fields=fields, dedup=dedup)
+    ]
+    write_extracted_text(results, output_txt_path, verbose=verbose)
+
+    return results
+
+def write_extracted_text(results, output_txt_path=None, verbose=False):
+    """
+    Optionally saves the extracted text of each item to a text file and prints it.
+
     Args:
-        image (numpy array): The image to process and upscale.
-        scale_factor (float): The factor by which to upscale the image.
-    
+        results (list): One MenuItemResult per item.
+        output_txt_path (str, optional): Path to save the extracted text. If None, no file is written.
+        verbose (bool): If True, prints the text extracted for each item.
+    """
+    if verbose:
+        for result in results:
+            print(f"Extracted text for item {result.index}: {result.text('title')} {result.text('description')} -> {result.text('price')}€")
+
+    # Write the extracted text in a single write
+    if output_txt_path is not None:
+        write_text(results, output_txt_path)
+        if verbose:
+            print(f"Extraction complete. Results saved to {output_txt_path}")
+
+def all_lines_result(ocr_result):
+    """
+    Returns the text of every line detected by a full PaddleOCR pass, joined in reading order.
+
+    Args:
+        ocr_result (list): Output of ocr.ocr(image) for a single image.
+
     Returns:
-        numpy array: The upscaled grayscale image.
+        tuple: (text, score), where the score is the mean line score weighted by the length of
+               each line, or ("", 0.0) if nothing was found.
     """
-    # Convert the image to grayscale
-    gray_image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-    
-    # Upscale the grayscale image
-    upscaled_image = cv2.resize(gray_image, None, fx=scale_factor, fy=scale_factor, interpolation=cv2.INTER_CUBIC)
-    
-    return upscaled_image
\ No newline at end of file
+    lines = [line[1] for line in (ocr_result[0] if ocr_result and ocr_result[0] else []) if line and line[1] and line[1][0]]
+    if not lines:
+        return "", 0.0
+    text = " ".join(text for text, _ in lines)
+    score = sum(len(text) * float(score) for text, score in lines) / sum(len(text) for text, _ in lines)
+    return text, score
+
+def to_bgr(image):
+    """
+    Converts a grayscale image to a 3-channel BGR image, as expected by the text recognizer.
+
+    Args:
+        image (numpy array): Grayscale or BGR image.
+
+    Returns:
+        numpy array: The BGR image.
+    """
+    if image.ndim == 2:
+        return cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+    return image
+
+def _gray_scratch(shape):
+    """
+    Returns a view of this thread's scratch buffer with the given 2D shape, growing the buffer if needed.
+
+    Args:
+        shape (tuple): (height, width) of the view.
+
+    Returns:
+        numpy array: Writable uint8 array of that shape, overwritten by the next call in the same thread.
+    """
+    size = shape[0] * shape[1]
+    buffer = getattr(_buffers, "gray", None)
+    if buffer is None or buffer.size < size:
+        buffer = np.empty(size, dtype=np.uint8)
+        _buffers.gray = buffer
+    return buffer[:size].reshape(shape)
+
+def estimate_line_count(gray, max_lines=20):
+    """
+    Estimates the number of text lines of a crop from its horizontal projection profile.
+
+    The crop is binarized with Otsu's threshold and each row is marked as text if it holds
+    enough ink; every run of consecutive text rows that is not much thinner than the tallest
+    one counts as a line.
+
+    Args:
+        gray (numpy array): Grayscale crop.
+        max_lines (int): Upper bound of the estimate.
+
+    Returns:
+        int: The estimated number of lines, at least 1.
+    """
+    if gray.shape[0] < 2 or gray.shape[1] < 2:
+        return 1
+    _, ink = cv2.threshold(gray, 0, 1, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    # Light text on a dark background: the text is the minority class
+    if ink.mean() > 0.5:
+        ink = 1 - ink
+
+    text_rows = ink.sum(axis=1) > max(1, 0.02 * gray.shape[1])
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], text_rows.view(np.uint8), [0]))))
+    heights = edges[1::2] - edges[::2]
+    if len(heights) == 0:
+        return 1
+    lines = int((heights >= max(2, 0.25 * heights.max())).sum())
+    return max(1, min(lines, max_lines))
+
+def adaptive_resize(image, single_line=True, target_line_height=TARGET_LINE_HEIGHT):
+    """
+    Converts a crop to grayscale and scales it so each text line is about target_line_height pixels high.
+
+    Oversized crops are downscaled, crops already close to the target are not resized at all,
+    and the number of lines of multi-line crops is estimated so their lines get the same
+    height as single-line ones. Single-line components narrower than MULTI_LINE_ASPECT times
+    their height (e.g. a wrapped dish name) are checked for several lines too. The
+    'resize_pixels' and 'resize_baseline_pixels' counters record the pixels produced versus
+    a fixed 1.5x resize.
+
+    Args:
+        image (numpy array): BGR or grayscale crop.
+        single_line (bool): If True, the crop normally holds one line of text (titles, prices)
+                            and its lines are only counted if its aspect ratio suggests a wrap;
+                            otherwise the line count is always estimated (descriptions).
+        target_line_height (int): Height of one text line after resizing.
+
+    Returns:
+        tuple: (grayscale crop owned by the caller, estimated number of text lines).
+    """
+    height, width = image.shape[:2]
+    if height == 0 or width == 0:
+        return np.zeros((height, width), dtype=np.uint8), 1
+
+    # Convert into the scratch buffer; it is only kept if no resize follows
+    if image.ndim == 3:
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY, dst=_gray_scratch((height, width)))
+    else:
+        gray = image
+
+    lines = 1 if single_line and width >= MULTI_LINE_ASPECT * height else estimate_line_count(gray)
+    scale = min(target_line_height * lines / height, MAX_UPSCALE)
+    count("resize_baseline_pixels", int(height * BASELINE_SCALE) * int(width * BASELINE_SCALE))
+
+    if abs(scale - 1) < RESIZE_TOLERANCE:
+        count("resize_skipped")
+        count("resize_pixels", height * width)
+        return gray.copy(), lines
+
+    interpolation = cv2.INTER_CUBIC if scale > 1 else cv2.INTER_AREA
+    size = (max(1, int(round(width * scale))), max(1, int(round(height * scale))))
+    resized = cv2.resize(gray, size, interpolation=interpolation)
+    count("resize_pixels", size[0] * size[1])
+    return resized, lines
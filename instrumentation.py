@@ -0,0 +1,339 @@
+"""
+Per-stage timing, counters and profiling hooks for the menu pipeline.
+
+Every stage of the pipeline (decode, detect, organize, resize, ocr, ...) records its latency in
+a histogram, and the amount of work done (detections, crops, OCR calls) in counters. The
+process-wide 'metrics' object collects them; exporters write them as structured JSON logs or
+in the Prometheus text format, and profile_request profiles a single request on demand.
+"""
+import os
+import sys
+import json
+import time
+import bisect
+import cProfile
+import pstats
+import threading
+from collections import Counter
+from contextlib import contextmanager
+
+# Upper bounds (in seconds) of the latency histogram buckets
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Metrics:
+    """
+    Thread-safe collection of counters and per-stage latency histograms.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        """
+        Args:
+            buckets (tuple): Sorted upper bounds (in seconds) of the latency histogram buckets.
+        """
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """
+        Clears every counter and histogram.
+        """
+        with self._lock:
+            self.counters = {}
+            # Stage name -> {"counts": per-bucket counts (last one is +Inf), "sum": seconds, "count": n}
+            self.histograms = {}
+
+    def increment(self, name, value=1):
+        """
+        Adds a value to a counter.
+
+        Args:
+            name (str): Counter name, e.g. 'ocr_calls'.
+            value (float): Amount to add.
+        """
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, stage, seconds):
+        """
+        Records one latency measurement of a stage.
+
+        Args:
+            stage (str): Stage name, e.g. 'detect'.
+            seconds (float): Measured latency.
+        """
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            histogram = self.histograms.get(stage)
+            if histogram is None:
+                histogram = {"counts": [0] * (len(self.buckets) + 1), "sum": 0.0, "count": 0}
+                self.histograms[stage] = histogram
+            histogram["counts"][index] += 1
+            histogram["sum"] += seconds
+            histogram["count"] += 1
+
+    @contextmanager
+    def stage(self, stage):
+        """
+        Context manager that times the enclosed block as one run of a stage.
+
+        Args:
+            stage (str): Stage name, e.g. 'detect'.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def snapshot(self):
+        """
+        Returns a copy of the current counters and histograms.
+
+        Returns:
+            dict: {'counters': {...}, 'histograms': {...}, 'buckets': [...]}.
+        """
+        with self._lock:
+            return {
+                "counters": dict(self.counters),
+                "histograms": {
+                    stage: {"counts": list(h["counts"]), "sum": h["sum"], "count": h["count"]}
+                    for stage, h in self.histograms.items()
+                },
+                "buckets": list(self.buckets)
+            }
+
+
+# Process-wide metrics used by the pipeline
+metrics = Metrics()
+
+
+def stage_timer(stage):
+    """
+    Times the enclosed block as one run of a stage in the process-wide metrics.
+
+    Args:
+        stage (str): Stage name, e.g. 'detect'.
+    """
+    return metrics.stage(stage)
+
+
+def count(name, value=1):
+    """
+    Adds a value to a counter of the process-wide metrics.
+
+    Args:
+        name (str): Counter name, e.g. 'ocr_calls'.
+        value (float): Amount to add.
+    """
+    metrics.increment(name, value)
+
+
+class JsonLogExporter:
+    """
+    Appends metrics snapshots to a file as JSON Lines, one line per export.
+    """
+
+    def __init__(self, path):
+        """
+        Args:
+            path (str): Path of the JSON Lines file.
+        """
+        self.path = path
+
+    def export(self, source=metrics, **fields):
+        """
+        Writes one snapshot.
+
+        Args:
+            source (Metrics): Metrics to export.
+            **fields: Extra fields added to the line (e.g. request_id).
+        """
+        line = json.dumps({"timestamp": time.time(), **fields, **source.snapshot()})
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+class PrometheusFileExporter:
+    """
+    Writes metrics in the Prometheus text exposition format, e.g. for the node_exporter textfile collector.
+    """
+
+    def __init__(self, path, prefix="menu_ocr"):
+        """
+        Args:
+            path (str): Path of the .prom file.
+            prefix (str): Prefix of every metric name.
+        """
+        self.path = path
+        self.prefix = prefix
+
+    def render(self, source=metrics):
+        """
+        Formats the metrics in the Prometheus text format.
+
+        Args:
+            source (Metrics): Metrics to format.
+
+        Returns:
+            str: The formatted metrics.
+        """
+        snapshot = source.snapshot()
+        lines = []
+        for name, value in sorted(snapshot["counters"].items()):
+            metric = f"{self.prefix}_{name}_total"
+            lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric} {value}")
+
+        metric = f"{self.prefix}_stage_seconds"
+        if snapshot["histograms"]:
+            lines.append(f"# TYPE {metric} histogram")
+        for stage, histogram in sorted(snapshot["histograms"].items()):
+            cumulative = 0
+            for bound, bucket_count in zip(snapshot["buckets"] + ["+Inf"], histogram["counts"]):
+                cumulative += bucket_count
+                lines.append(f'{metric}_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+            lines.append(f'{metric}_sum{{stage="{stage}"}} {histogram["sum"]}')
+            lines.append(f'{metric}_count{{stage="{stage}"}} {histogram["count"]}')
+        return "\n".join(lines) + "\n"
+
+    def export(self, source=metrics):
+        """
+        Rewrites the .prom file; the file is replaced atomically so scrapers never read half of it.
+
+        Args:
+            source (Metrics): Metrics to export.
+        """
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.render(source))
+        os.replace(tmp_path, self.path)
+
+
+class SamplingProfiler:
+    """
+    Low-overhead statistical profiler: a background thread samples the stack of the profiled
+    thread at a fixed interval and counts the collapsed stacks (flame graph format).
+    """
+
+    def __init__(self, interval=0.005, thread_id=None):
+        """
+        Args:
+            interval (float): Seconds between two samples.
+            thread_id (int, optional): Thread to sample. Defaults to the thread calling start().
+        """
+        self.interval = interval
+        self.thread_id = thread_id
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """
+        Starts sampling in a background thread.
+        """
+        if self.thread_id is None:
+            self.thread_id = threading.get_ident()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stops sampling and waits for the background thread to finish.
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        """
+        Sampling loop: records the stack of the profiled thread every 'interval' seconds.
+        """
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            if stack:
+                self.samples[";".join(reversed(stack))] += 1
+
+    def write(self, output_path):
+        """
+        Writes the collapsed stacks, one 'frame;frame;... count' line per distinct stack.
+
+        Args:
+            output_path (str): Path of the output file.
+        """
+        with open(output_path, "w", encoding="utf-8") as f:
+            for stack, samples in self.samples.most_common():
+                f.write(f"{stack} {samples}\n")
+
+
+@contextmanager
+def profile_request(mode=None, output_path=None):
+    """
+    Profiles the enclosed block, typically one request, when switched on.
+
+    Args:
+        mode (str, optional): None (off), 'cprofile' (deterministic, writes a pstats file that
+                              can be opened with snakeviz or pstats) or 'sampling' (writes
+                              collapsed stacks for flame graph tools).
+        output_path (str, optional): Where to write the profile. If None, a summary is printed.
+    """
+    if mode is None:
+        yield
+        return
+
+    if mode == "cprofile":
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            if output_path is not None:
+                profiler.dump_stats(output_path)
+            else:
+                pstats.Stats(profiler).sort_stats("cumulative").print_stats(25)
+    elif mode == "sampling":
+        profiler = SamplingProfiler()
+        profiler.start()
+        try:
+            yield
+        finally:
+            profiler.stop()
+            if output_path is not None:
+                profiler.write(output_path)
+            else:
+                for stack, samples in profiler.samples.most_common(10):
+                    print(f"{samples:6d} {stack}")
+    else:
+        raise ValueError(f"Unknown profile mode: {mode}")
+
+
+def snapshot_delta(before, after):
+    """
+    Computes the work done between two snapshots, e.g. while processing one page.
+
+    Args:
+        before (dict): Snapshot taken before (see Metrics.snapshot).
+        after (dict): Snapshot taken after.
+
+    Returns:
+        dict: {'counters': {name: increase}, 'stage_seconds': {stage: time spent}}.
+    """
+    counters = {
+        name: value - before["counters"].get(name, 0)
+        for name, value in after["counters"].items()
+        if value != before["counters"].get(name, 0)
+    }
+    stage_seconds = {
+        stage: histogram["sum"] - before["histograms"].get(stage, {"sum": 0.0})["sum"]
+        for stage, histogram in after["histograms"].items()
+        if histogram["count"] != before["histograms"].get(stage, {"count": 0})["count"]
+    }
+    return {"counters": counters, "stage_seconds": stage_seconds}
@@ -6,4 +6,4 @@ output_image_path = "output_with_bboxes.jpg"
 output_txt_path = "menu_text_output.txt"
 
 # Run the function
-process_menu_image(test_image_path, output_image_path, output_txt_path)
\ No newline at end of file
+process_menu_image(test_image_path, output_image_path, output_txt_path, verbose=True)
\ No newline at end of file
@@ -0,0 +1,157 @@
+"""
+Process-wide registry for the YOLO and PaddleOCR models used by the menu pipeline.
+
+Models are loaded lazily on first use and cached by their configuration, so importing
+the pipeline modules is cheap and a process only holds the models it actually uses.
+Loading is thread-safe: concurrent callers asking for the same model wait for a single load.
+"""
+import os
+import threading
+
+# Path to the trained YOLO menu model
+DEFAULT_YOLO_WEIGHTS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'yolov8_menu_card', 'menu_items_model', 'weights', 'best.pt')
+
+# Loaded models and one lock per model key, so loading one model does not block another
+_models = {}
+_key_locks = {}
+_registry_lock = threading.Lock()
+
+
+def _get_or_load(key, loader):
+    """
+    Returns the model stored under 'key', loading it with 'loader' if it is not loaded yet.
+
+    Args:
+        key (tuple): Hashable key identifying the model configuration.
+        loader (callable): Function with no arguments that builds the model.
+
+    Returns:
+        object: The loaded model.
+    """
+    model = _models.get(key)
+    if model is not None:
+        return model
+
+    with _registry_lock:
+        key_lock = _key_locks.setdefault(key, threading.Lock())
+
+    with key_lock:
+        # Another thread may have finished loading while we waited
+        model = _models.get(key)
+        if model is None:
+            model = loader()
+            _models[key] = model
+    return model
+
+
+def ocr_key(lang='es', use_angle_cls=True, **options):
+    """
+    Builds the registry key of a PaddleOCR configuration.
+
+    Args:
+        lang (str): OCR language.
+        use_angle_cls (bool): Whether the angle classifier is loaded.
+        **options: Any other PaddleOCR constructor arguments.
+
+    Returns:
+        tuple: The registry key.
+    """
+    return ("paddleocr", lang, use_angle_cls, tuple(sorted(options.items())))
+
+
+def yolo_key(weights_path=DEFAULT_YOLO_WEIGHTS):
+    """
+    Builds the registry key of a YOLO model.
+
+    Args:
+        weights_path (str): Path to the model weights.
+
+    Returns:
+        tuple: The registry key.
+    """
+    return ("yolo", os.path.abspath(weights_path))
+
+
+def get_ocr(lang='es', use_angle_cls=True, **options):
+    """
+    Returns the shared PaddleOCR instance for the given configuration, loading it on first use.
+
+    Args:
+        lang (str): OCR language.
+        use_angle_cls (bool): Whether to load the text angle classifier.
+        **options: Any other PaddleOCR constructor arguments (e.g. rec_batch_num).
+
+    Returns:
+        PaddleOCR: The OCR engine.
+    """
+    def load():
+        from paddleocr import PaddleOCR
+        return PaddleOCR(use_angle_cls=use_angle_cls, lang=lang, **options)
+
+    return _get_or_load(ocr_key(lang, use_angle_cls, **options), load)
+
+
+def get_yolo(weights_path=DEFAULT_YOLO_WEIGHTS, **options):
+    """
+    Returns the shared YOLO model for the given weights, loading it on first use.
+
+    The backend is chosen by the weights file: '.onnx' models run on ONNX Runtime without
+    importing torch (see yolov8_menu_card.onnx_backend), anything else is loaded with ultralytics.
+
+    Args:
+        weights_path (str): Path to the model weights.
+        **options: OnnxDetector arguments (intra_op_threads, inter_op_threads, providers, ...).
+                   They only apply when the model is loaded, so pass them to the first call
+                   (typically warm_up) of a process.
+
+    Returns:
+        YOLO | OnnxDetector: The detection model.
+    """
+    def load():
+        if weights_path.lower().endswith(".onnx"):
+            from yolov8_menu_card.onnx_backend import OnnxDetector
+            return OnnxDetector(weights_path, **options)
+        from ultralytics import YOLO
+        return YOLO(weights_path)
+
+    return _get_or_load(yolo_key(weights_path), load)
+
+
+def warm_up(ocr_options=None, yolo_weights=DEFAULT_YOLO_WEIGHTS, yolo_options=None):
+    """
+    Loads models ahead of time, e.g. when a worker process starts.
+
+    Args:
+        ocr_options (dict, optional): Keyword arguments for get_ocr. If None, no OCR model is loaded.
+        yolo_weights (str, optional): Weights for get_yolo. If None, no YOLO model is loaded.
+        yolo_options (dict, optional): Extra keyword arguments for get_yolo, e.g. ONNX Runtime thread counts.
+    """
+    if yolo_weights is not None:
+        get_yolo(yolo_weights, **(yolo_options or {}))
+    if ocr_options is not None:
+        get_ocr(**ocr_options)
+
+
+def unload(key=None):
+    """
+    Drops models from the registry so their memory can be reclaimed.
+
+    Args:
+        key (tuple, optional): Key of the model to unload (see ocr_key and yolo_key).
+                               If None, every model is unloaded.
+    """
+    with _registry_lock:
+        if key is None:
+            _models.clear()
+        else:
+            _models.pop(key, None)
+
+
+def loaded_models():
+    """
+    Lists the keys of the models currently held by the registry.
+
+    Returns:
+        list: The registry keys of the loaded models.
+    """
+    return list(_models.keys())
@@ -0,0 +1,130 @@
+import json
+import os
+
+import cv2
+import numpy as np
+import pytest
+
+from image_to_text import document_stream
+from image_to_text.menu_results import make_item_result
+
+
+class PageCrash(Exception):
+    pass
+
+
+def write_pages(directory, count):
+    directory.mkdir(exist_ok=True)
+    for index in range(count):
+        # The page index is stored in the pixels, so the fake OCR can tell the pages apart
+        cv2.imwrite(str(directory / f"page_{index:02d}.png"), np.full((8, 8, 3), index, dtype=np.uint8))
+    return str(directory)
+
+
+def fake_process_menu_image(calls, crash_on=None):
+    """
+    Returns a stand-in for process_menu_image that records the pages it is called on and
+    returns two items per page, named after the page. It raises PageCrash on page crash_on.
+    """
+    def process(image, **options):
+        page = int(cv2.imread(image)[0, 0, 0])
+        calls.append(page)
+        if page == crash_on:
+            raise PageCrash(page)
+        return [
+            make_item_result(item + 1, (0, 0, 10, 10), {"title": (0, 0, 10, 5), "price": (0, 5, 10, 10)},
+                             (f"dish {page}.{item}", "", "12,50"), (0.9, 0.0, 0.9))
+            for item in range(2)
+        ]
+    return process
+
+
+def read_output(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_resume_skips_done_pages_and_truncates_partial_write(tmp_path, monkeypatch):
+    source = write_pages(tmp_path / "pages", 5)
+    output = str(tmp_path / "items.jsonl")
+    calls = []
+
+    monkeypatch.setattr(document_stream, "process_menu_image", fake_process_menu_image(calls, crash_on=3))
+    with pytest.raises(PageCrash):
+        document_stream.process_document(source, output)
+    # A partial line left behind by the crashed page
+    with open(output, "ab") as f:
+        f.write(b'{"page": 4, "pa')
+
+    monkeypatch.setattr(document_stream, "process_menu_image", fake_process_menu_image(calls))
+    summary = document_stream.process_document(source, output)
+
+    assert summary == {"pages": 5, "items": 10, "resumed_from": 3}
+    # Pages 0-2 were processed once, the crashed page 3 twice
+    assert calls == [0, 1, 2, 3, 3, 4]
+    items = read_output(output)
+    assert [item["page"] for item in items] == [1, 1, 2, 2, 3, 3, 4, 4, 5, 5]
+    assert all(item["path"].endswith(f"page_{item['page'] - 1:02d}.png") for item in items)
+    assert [item["title"]["text"] for item in items[4:6]] == ["dish 2.0", "dish 2.1"]
+
+
+def test_finished_document_is_not_processed_again(tmp_path, monkeypatch):
+    source = write_pages(tmp_path / "pages", 3)
+    output = str(tmp_path / "items.jsonl")
+    calls = []
+    monkeypatch.setattr(document_stream, "process_menu_image", fake_process_menu_image(calls))
+
+    document_stream.process_document(source, output)
+    summary = document_stream.process_document(source, output)
+
+    assert summary == {"pages": 3, "items": 6, "resumed_from": 3}
+    assert calls == [0, 1, 2]
+    assert len(read_output(output)) == 6
+
+
+def test_changed_directory_starts_over(tmp_path, monkeypatch):
+    directory = tmp_path / "pages"
+    source = write_pages(directory, 4)
+    output = str(tmp_path / "items.jsonl")
+    calls = []
+
+    monkeypatch.setattr(document_stream, "process_menu_image", fake_process_menu_image(calls, crash_on=2))
+    with pytest.raises(PageCrash):
+        document_stream.process_document(source, output)
+
+    # A page inserted before the crash point would shift the page numbers of a resumed run
+    cv2.imwrite(str(directory / "page_00a.png"), np.full((8, 8, 3), 9, dtype=np.uint8))
+    calls.clear()
+    monkeypatch.setattr(document_stream, "process_menu_image", fake_process_menu_image(calls))
+    summary = document_stream.process_document(source, output)
+
+    assert summary == {"pages": 5, "items": 10, "resumed_from": 0}
+    assert calls == [0, 9, 1, 2, 3]
+    assert [item["page"] for item in read_output(output)] == [1, 1, 2, 2, 3, 3, 4, 4, 5, 5]
+
+
+def test_no_resume_starts_over(tmp_path, monkeypatch):
+    source = write_pages(tmp_path / "pages", 3)
+    output = str(tmp_path / "items.jsonl")
+    calls = []
+    monkeypatch.setattr(document_stream, "process_menu_image", fake_process_menu_image(calls))
+
+    document_stream.process_document(source, output)
+    summary = document_stream.process_document(source, output, resume=False)
+
+    assert summary == {"pages": 3, "items": 6, "resumed_from": 0}
+    assert calls == [0, 1, 2, 0, 1, 2]
+    assert len(read_output(output)) == 6
+
+
+def test_checkpoint_of_another_document_is_ignored(tmp_path):
+    checkpoint_path = str(tmp_path / "items.jsonl.checkpoint")
+    first = document_stream.document_fingerprint(write_pages(tmp_path / "first", 2))
+    second = document_stream.document_fingerprint(write_pages(tmp_path / "second", 2))
+
+    document_stream.save_checkpoint(checkpoint_path, first, 2, 4, 100)
+
+    assert document_stream.load_checkpoint(checkpoint_path, first)["pages_done"] == 2
+    assert document_stream.load_checkpoint(checkpoint_path, second) is None
+    assert document_stream.load_checkpoint(str(tmp_path / "missing"), first) is None
+    assert not os.path.exists(f"{checkpoint_path}.tmp")
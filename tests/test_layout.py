@@ -0,0 +1,73 @@
+import random
+
+import numpy as np
+
+from yolov8_menu_card.layout import IntervalIndex, cluster_columns, reading_order
+
+
+def menu_boxes(columns=3, rows=10, skew=0.0, column_width=300, gap=60, row_height=80):
+    """
+    Item boxes of a grid menu, listed column by column in reading order. With skew, each row
+    drifts right by skew * y pixels, as in a rotated photo.
+    """
+    boxes = []
+    for column in range(columns):
+        for row in range(rows):
+            y1 = 100 + row * row_height
+            x1 = 50 + column * (column_width + gap) + skew * y1
+            boxes.append([x1, y1, x1 + column_width, y1 + row_height - 10])
+    return np.array(boxes)
+
+
+def test_reading_order_multi_column():
+    boxes = menu_boxes(columns=4, rows=12)
+    assert reading_order(boxes) == list(range(len(boxes)))
+
+
+def test_reading_order_skewed_columns():
+    # Columns drift by up to 50 px over the page, more than a fixed x bucket tolerates
+    boxes = menu_boxes(columns=3, rows=20, skew=0.03)
+    assert reading_order(boxes) == list(range(len(boxes)))
+    assert [len(column) for column in cluster_columns(boxes)] == [20, 20, 20]
+
+
+def test_reading_order_negative_skew():
+    boxes = menu_boxes(columns=3, rows=20, skew=-0.03)
+    assert reading_order(boxes) == list(range(len(boxes)))
+
+
+def test_reading_order_does_not_depend_on_input_order():
+    boxes = menu_boxes(columns=3, rows=8, skew=0.02)
+    shuffled = list(range(len(boxes)))
+    random.Random(0).shuffle(shuffled)
+    order = reading_order(boxes[shuffled])
+    assert [shuffled[index] for index in order] == list(range(len(boxes)))
+
+
+def test_cluster_columns_keeps_a_wide_box_in_its_column():
+    boxes = menu_boxes(columns=2, rows=6)
+    # A box slightly wider than its column, e.g. a long dish name
+    boxes[2, 2] += 80
+    assert [sorted(column.tolist()) for column in cluster_columns(boxes)] == [list(range(6)), list(range(6, 12))]
+
+
+def test_reading_order_empty():
+    assert reading_order(np.zeros((0, 4))) == []
+    assert cluster_columns([]) == []
+
+
+def test_interval_index_matches_brute_force():
+    rng = np.random.default_rng(0)
+    corners = rng.uniform(0, 1000, size=(300, 2))
+    boxes = np.hstack([corners, corners + rng.uniform(5, 80, size=(300, 2))])
+    regions = np.array([[100, 100, 400, 300], [0, 0, 1000, 1000], [500, 500, 500, 500]])
+
+    index = IntervalIndex(boxes)
+    region_indices, box_indices = index.contained_pairs(regions)
+    for region_index, region in enumerate(regions):
+        expected = np.flatnonzero(
+            (boxes[:, 0] >= region[0]) & (boxes[:, 1] >= region[1]) &
+            (boxes[:, 2] <= region[2]) & (boxes[:, 3] <= region[3])
+        )
+        assert sorted(index.contained_in(region).tolist()) == expected.tolist()
+        assert sorted(box_indices[region_indices == region_index].tolist()) == expected.tolist()
@@ -0,0 +1,25 @@
+import pytest
+
+from image_to_text.menu_results import parse_price
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("12,50 €", 12.5),
+    ("12.5", 12.5),
+    ("9,5", 9.5),
+    ("14", 14.0),
+    ("1.200,00€", 1200.0),
+    ("1.200", 1200.0),
+    ("1 200,00 €", 1200.0),
+    ("PVP 3,20 / 4,00", 3.2),
+    # Half and full portion: only the first price is read
+    ("3,50 8,00", 3.5),
+    ("12 50", 12.0),
+])
+def test_parse_price(text, expected):
+    assert parse_price(text) == pytest.approx(expected)
+
+
+@pytest.mark.parametrize("text", ["Consultar", "", None])
+def test_parse_price_without_number(text):
+    assert parse_price(text) is None
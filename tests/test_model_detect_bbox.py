@@ -0,0 +1,97 @@
+import numpy as np
+import pytest
+
+from yolov8_menu_card.model_detect_bbox import ITEM_CLASS, detect_tiled, merge_boxes, tile_origins
+
+PRICE_CLASS = 2
+TITLE_CLASS = 3
+
+
+def position_page(height, width):
+    """
+    Builds a page whose pixels encode their own coordinates, so a fake detector can tell
+    where a tile was cut from.
+    """
+    ys, xs = np.mgrid[0:height, 0:width]
+    return np.stack([xs & 255, ys & 255, (xs >> 8) | ((ys >> 8) << 4)], axis=-1).astype(np.uint8)
+
+
+class FakeDetector:
+    """
+    Sees the objects of a page: a tile gets the part of every object inside it, in tile
+    coordinates, and the whole page gets the item boxes only, like a downsized pass.
+    """
+    def __init__(self, objects):
+        self.objects = np.array(objects, dtype=np.float32)
+        self.tiles = 0
+
+    def predict(self, source, save=False, batch=None):
+        if not isinstance(source, list):
+            return [self.objects[self.objects[:, 5] == ITEM_CLASS]]
+        self.tiles += len(source)
+        return [self._in_tile(tile) for tile in source]
+
+    def _in_tile(self, tile):
+        b, g, r = (int(v) for v in tile[0, 0])
+        x0, y0 = b | ((r & 15) << 8), g | ((r >> 4) << 8)
+        height, width = tile.shape[:2]
+        boxes = []
+        for x1, y1, x2, y2, confidence, class_id in self.objects:
+            x1, x2 = max(x1, x0) - x0, min(x2, x0 + width) - x0
+            y1, y2 = max(y1, y0) - y0, min(y2, y0 + height) - y0
+            if x2 > x1 and y2 > y1:
+                boxes.append([x1, y1, x2, y2, confidence, class_id])
+        return np.array(boxes, dtype=np.float32).reshape(-1, 6)
+
+
+def test_tile_origins_cover_the_side():
+    assert tile_origins(500, 640, 0.2) == [0]
+    assert tile_origins(1600, 640, 0.2) == [0, 512, 960]
+    assert tile_origins(1200, 640, 0.2) == [0, 512, 560]
+
+
+def test_merge_boxes_drops_duplicates_and_fragments():
+    boxes = np.array([
+        [100, 100, 200, 150, 0.9, PRICE_CLASS],
+        # The same price seen by a neighbouring tile
+        [102, 101, 201, 151, 0.8, PRICE_CLASS],
+        # A fragment of the price, cut by a tile seam
+        [150, 100, 200, 150, 0.85, PRICE_CLASS],
+        # A title overlapping the price is another object
+        [100, 100, 200, 150, 0.7, TITLE_CLASS],
+        [400, 400, 500, 450, 0.6, PRICE_CLASS],
+    ], dtype=np.float32)
+
+    merged = merge_boxes(boxes)
+
+    assert merged[:, 4].tolist() == pytest.approx([0.9, 0.7, 0.6])
+    assert merged[:, 5].tolist() == [PRICE_CLASS, TITLE_CLASS, PRICE_CLASS]
+
+
+def test_detect_tiled_merges_boxes_across_seams():
+    objects = [
+        # Prices inside one tile, across a vertical seam and across both seams of a corner
+        [100, 100, 180, 140, 0.9, PRICE_CLASS],
+        [600, 300, 680, 340, 0.8, PRICE_CLASS],
+        [620, 530, 700, 570, 0.85, PRICE_CLASS],
+        [1300, 1000, 1500, 1060, 0.7, TITLE_CLASS],
+        # An item spanning several tiles, found by the whole-page pass
+        [50, 50, 1550, 1150, 0.95, ITEM_CLASS],
+    ]
+    detector = FakeDetector(objects)
+
+    boxes = detect_tiled(detector, position_page(1200, 1600), tile_size=640, overlap=0.2, blank_std=None)
+
+    assert detector.tiles == 9
+    by_confidence = sorted(boxes, key=lambda box: box[4])
+    assert np.array(by_confidence, dtype=np.float32) == pytest.approx(np.array(sorted(objects, key=lambda box: box[4]), dtype=np.float32))
+
+
+def test_detect_tiled_skips_blank_tiles():
+    page = np.full((1200, 1600, 3), 255, dtype=np.uint8)
+    page[50:150, 50:300] = 0
+    detector = FakeDetector([[50, 50, 300, 150, 0.9, TITLE_CLASS]])
+    detector._in_tile = lambda tile: np.zeros((0, 6), dtype=np.float32)
+
+    assert detect_tiled(detector, page, tile_size=640, overlap=0.2, full_pass=False) == []
+    assert detector.tiles == 1
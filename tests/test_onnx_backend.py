@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+
+from yolov8_menu_card.onnx_backend import PAD_VALUE, decode_predictions, letterbox, non_max_suppression
+
+
+def test_non_max_suppression_keeps_the_best_of_overlapping_boxes():
+    boxes = np.array([[0, 0, 100, 100], [5, 5, 105, 105], [200, 200, 300, 300]], dtype=np.float32)
+    scores = np.array([0.8, 0.9, 0.7], dtype=np.float32)
+    class_ids = np.array([1, 1, 1])
+
+    assert non_max_suppression(boxes, scores, class_ids).tolist() == [1, 2]
+
+
+def test_non_max_suppression_is_per_class():
+    # A price box inside its item box must survive
+    boxes = np.array([[0, 0, 100, 100], [2, 2, 100, 100]], dtype=np.float32)
+    scores = np.array([0.9, 0.8], dtype=np.float32)
+
+    assert non_max_suppression(boxes, scores, np.array([1, 2])).tolist() == [0, 1]
+    assert non_max_suppression(boxes, scores, np.array([1, 1])).tolist() == [0]
+
+
+def test_non_max_suppression_limits_and_empty_input():
+    boxes = np.array([[10 * i, 0, 10 * i + 5, 5] for i in range(5)], dtype=np.float32)
+    scores = np.linspace(0.5, 0.9, 5).astype(np.float32)
+
+    assert non_max_suppression(boxes, scores, np.zeros(5, dtype=int), max_detections=2).tolist() == [4, 3]
+    assert len(non_max_suppression(np.zeros((0, 4), dtype=np.float32), np.zeros(0), np.zeros(0, dtype=int))) == 0
+
+
+def test_letterbox_pads_to_a_square():
+    tensor, ratio, padding = letterbox(np.zeros((960, 1280, 3), dtype=np.uint8), 640)
+
+    assert tensor.shape == (3, 640, 640) and tensor.dtype == np.float32
+    assert ratio == 0.5 and padding == (0, 80)
+    assert tensor[:, 0, 0] == pytest.approx([PAD_VALUE / 255] * 3)
+    assert tensor[:, 80:560, :].max() == 0
+
+
+def anchor(cx, cy, w, h, class_scores):
+    return [cx, cy, w, h, *class_scores]
+
+
+def test_decode_predictions_maps_boxes_back_to_the_image():
+    # A 1280x960 page letterboxed to 640: ratio 0.5 and 80 pixels of padding at the top
+    prediction = np.array([
+        # Item at (100, 200, 300, 400) in the image
+        anchor(100, 230, 100, 100, [0.0, 0.9, 0.0, 0.0]),
+        # A slightly shifted duplicate, removed by NMS
+        anchor(102, 231, 100, 100, [0.0, 0.8, 0.0, 0.0]),
+        # Below the confidence threshold
+        anchor(400, 300, 50, 50, [0.1, 0.0, 0.0, 0.0]),
+        # A price crossing the right border, clipped to the image
+        anchor(630, 300, 40, 20, [0.0, 0.0, 0.6, 0.0]),
+    ], dtype=np.float32).T
+
+    boxes = decode_predictions(prediction, 0.5, (0, 80), (960, 1280))
+
+    assert boxes.shape == (2, 6)
+    assert boxes[0] == pytest.approx([100, 200, 300, 400, 0.9, 1])
+    assert boxes[1] == pytest.approx([1220, 420, 1280, 460, 0.6, 2])
+
+
+def test_decode_predictions_without_boxes():
+    prediction = np.zeros((8, 10), dtype=np.float32)
+    assert decode_predictions(prediction, 1.0, (0, 0), (640, 640)).shape == (0, 6)
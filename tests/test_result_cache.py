@@ -0,0 +1,94 @@
+import os
+from collections import OrderedDict
+
+import numpy as np
+
+from image_to_text.result_cache import ResultCache, image_digest, ocr_cache_key
+
+# Each value is stored as a 102-byte JSON string
+VALUE = "x" * 100
+
+
+def age(cache, stage, key, seconds_ago):
+    """
+    Sets the last-use time of an entry, so the LRU order does not depend on timing.
+    """
+    path = os.path.join(cache.cache_dir, stage, f"{key}.json")
+    timestamp = os.stat(path).st_mtime - seconds_ago
+    os.utime(path, (timestamp, timestamp))
+
+
+def test_get_returns_stored_value_and_counts_hits(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    cache.put("detection", "page", [[1.0, 2.0, 3.0, 4.0, 0.9, 1]])
+
+    assert cache.get("detection", "page") == [[1.0, 2.0, 3.0, 4.0, 0.9, 1]]
+    assert cache.get("ocr", "page") is None
+    assert cache.get("detection", "other") is None
+    stats = cache.stats()
+    assert stats["hits"] == {"detection": 1, "ocr": 0}
+    assert stats["misses"] == {"detection": 1, "ocr": 1}
+
+
+def test_eviction_removes_least_recently_used_entries(tmp_path):
+    cache = ResultCache(str(tmp_path), max_bytes=350)
+    for index, key in enumerate(["a", "b", "c"]):
+        cache.put("ocr", key, VALUE)
+        age(cache, "ocr", key, 100 - index)
+
+    # Reading 'a' makes it the most recently used, so 'b' is now the oldest
+    assert cache.get("ocr", "a") == VALUE
+    cache.put("ocr", "d", VALUE)
+
+    assert cache.get("ocr", "b") is None
+    assert [cache.get("ocr", key) for key in ["a", "c", "d"]] == [VALUE] * 3
+    assert cache.stats()["size_bytes"] <= 350
+
+
+def test_eviction_spans_stages(tmp_path):
+    cache = ResultCache(str(tmp_path), max_bytes=250)
+    cache.put("detection", "old", VALUE)
+    age(cache, "detection", "old", 100)
+    cache.put("ocr", "new", VALUE)
+    cache.put("ocr", "newest", VALUE)
+
+    assert cache.get("detection", "old") is None
+    assert cache.get("ocr", "new") == VALUE
+    assert cache.get("ocr", "newest") == VALUE
+
+
+def test_size_is_restored_when_reopened(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    cache.put("ocr", "a", VALUE)
+    cache.put("detection", "b", VALUE)
+
+    assert ResultCache(str(tmp_path)).stats()["size_bytes"] == cache.stats()["size_bytes"] == 204
+
+
+def test_image_digest_depends_on_shape_and_content():
+    image = np.zeros((4, 6, 3), dtype=np.uint8)
+    assert image_digest(image) == image_digest(image.copy())
+    assert image_digest(image) != image_digest(image.reshape(6, 4, 3))
+    changed = image.copy()
+    changed[0, 0, 0] = 1
+    assert image_digest(image) != image_digest(changed)
+
+
+def test_ocr_cache_key_depends_on_the_boxes_read():
+    items = OrderedDict([((0, 0, 10, 10), {"title": (0, 0, 10, 5), "description": None, "price": (0, 5, 10, 10)})])
+    moved = OrderedDict([((0, 0, 10, 11), {"title": (0, 0, 10, 5), "description": None, "price": (0, 5, 10, 11)})])
+    options = {"lang": "es"}
+
+    key = ocr_cache_key("image", items, options)
+    assert key == ocr_cache_key("image", OrderedDict(items), dict(options))
+    assert key != ocr_cache_key("image", moved, options)
+    assert key != ocr_cache_key("other image", items, options)
+
+
+def test_ocr_cache_key_depends_on_fields_and_dedup():
+    items = OrderedDict([((0, 0, 10, 10), {"title": (0, 0, 10, 5), "description": None, "price": (0, 5, 10, 10)})])
+    options = {"lang": "es"}
+
+    key = ocr_cache_key("image", items, options, preprocessing={"dedup": False})
+    assert key != ocr_cache_key("image", items, options, fields=("price",), preprocessing={"dedup": False})
+    assert key != ocr_cache_key("image", items, options, preprocessing={"dedup": True})
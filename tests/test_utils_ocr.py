@@ -0,0 +1,163 @@
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+import pytest
+
+from image_to_text import utils_ocr
+from image_to_text.utils_ocr import (
+    MAX_UPSCALE, TARGET_LINE_HEIGHT, adaptive_resize, crop_fingerprint, estimate_line_count, iter_item_texts
+)
+
+
+def text_crop(text, scale=1.0, shade=0, background=255):
+    """
+    Renders a line of text as a tight grayscale crop, like a detected price or title box.
+    """
+    height, width = int(40 * scale), int(22 * scale * len(text))
+    crop = np.full((height, width), background, dtype=np.uint8)
+    cv2.putText(crop, text, (int(4 * scale), int(30 * scale)), cv2.FONT_HERSHEY_SIMPLEX, scale, shade, max(1, int(2 * scale)))
+    return crop
+
+
+class FakeOCR:
+    """
+    Stands in for PaddleOCR: reads every crop with a confident score and records what it was given.
+    """
+    def __init__(self):
+        self.recognized = []
+
+    def ocr(self, images, det=True, cls=True):
+        if not isinstance(images, list):
+            return [[[[[0, 0], [1, 0], [1, 1], [0, 1]], (f"full {images.shape[1]}", 0.9)]]]
+        self.recognized.extend(images)
+        return [[(f"read {int(image.mean())}", 0.95) for image in images]]
+
+
+@pytest.fixture
+def fake_ocr(monkeypatch):
+    ocr = FakeOCR()
+    monkeypatch.setattr(utils_ocr, "get_ocr", lambda **options: ocr)
+    return ocr
+
+
+def test_crop_fingerprint_matches_the_same_label():
+    label = text_crop("12,50")
+    assert crop_fingerprint(label) == crop_fingerprint(label.copy())
+    assert crop_fingerprint(label) == crop_fingerprint(cv2.cvtColor(label, cv2.COLOR_GRAY2BGR))
+
+
+def test_crop_fingerprint_tells_labels_apart():
+    assert crop_fingerprint(text_crop("12,50")) != crop_fingerprint(text_crop("19,90"))
+    # Same start, different length
+    assert crop_fingerprint(text_crop("12,50")) != crop_fingerprint(text_crop("12,50 EUR"))
+
+
+def price_page(prices):
+    """
+    Builds a page with one item per price, stacked vertically, each with a price box only.
+    """
+    crops = [text_crop(price) for price in prices]
+    width = max(crop.shape[1] for crop in crops) + 20
+    page = np.full((60 * len(crops), width, 3), 255, dtype=np.uint8)
+    sorted_items = OrderedDict()
+    for row, crop in enumerate(crops):
+        top = 60 * row + 10
+        page[top:top + crop.shape[0], 10:10 + crop.shape[1]] = crop[:, :, None]
+        price_bbox = (10, top, 10 + crop.shape[1], top + crop.shape[0])
+        sorted_items[(0, 60 * row, width, 60 * row + 60)] = {"title": None, "description": None, "price": price_bbox}
+    return page, sorted_items
+
+
+@pytest.mark.parametrize("batch_size", [None, 4])
+def test_dedup_reads_repeated_crops_once(fake_ocr, batch_size):
+    page, sorted_items = price_page(["12,50", "9,90", "12,50", "12,50"])
+
+    items = list(iter_item_texts(page, sorted_items, batch_size=batch_size, dedup=True))
+
+    assert len(fake_ocr.recognized) == 2
+    prices = [texts[2] for _, _, texts, _ in items]
+    assert prices[0] == prices[2] == prices[3] != prices[1]
+    assert all(scores[2] == 0.95 for _, _, _, scores in items)
+
+
+def test_without_dedup_every_crop_is_read(fake_ocr):
+    page, sorted_items = price_page(["12,50", "9,90", "12,50", "12,50"])
+
+    items = list(iter_item_texts(page, sorted_items, batch_size=4))
+
+    assert len(fake_ocr.recognized) == 4
+    assert [i for i, _, _, _ in items] == [1, 2, 3, 4]
+
+
+def paragraph(lines, line_height=40, width=360):
+    """
+    Renders a block of text lines, like a detected description box.
+    """
+    crop = np.full((line_height * lines, width), 255, dtype=np.uint8)
+    for line in range(lines):
+        cv2.putText(crop, "Arroz con marisco", (4, line_height * line + 30), cv2.FONT_HERSHEY_SIMPLEX, 1.0, 0, 2)
+    return crop
+
+
+@pytest.mark.parametrize("lines", [1, 2, 3, 5])
+def test_estimate_line_count(lines):
+    assert estimate_line_count(paragraph(lines)) == lines
+
+
+def test_estimate_line_count_light_text_on_dark_background():
+    assert estimate_line_count(255 - paragraph(3)) == 3
+
+
+def test_estimate_line_count_blank_and_tiny_crops():
+    assert estimate_line_count(np.full((80, 200), 255, dtype=np.uint8)) == 1
+    assert estimate_line_count(np.zeros((1, 50), dtype=np.uint8)) == 1
+
+
+def test_adaptive_resize_scales_lines_to_the_target_height():
+    # A small title is upscaled, a huge one downscaled, both to one target-height line
+    small, small_lines = adaptive_resize(cv2.resize(text_crop("Paella valenciana"), None, fx=0.5, fy=0.5))
+    large, large_lines = adaptive_resize(cv2.resize(text_crop("Paella valenciana"), None, fx=4, fy=4))
+
+    assert small.shape[0] == large.shape[0] == TARGET_LINE_HEIGHT
+    assert small_lines == large_lines == 1
+
+
+def test_adaptive_resize_keeps_crops_close_to_the_target():
+    crop = text_crop("Paella valenciana", scale=TARGET_LINE_HEIGHT / 40)
+    resized, _ = adaptive_resize(crop)
+
+    assert resized.shape == crop.shape
+    assert np.array_equal(resized, crop) and resized is not crop
+
+
+def test_adaptive_resize_caps_the_upscale():
+    resized, _ = adaptive_resize(np.full((4, 80), 255, dtype=np.uint8))
+    assert resized.shape == (4 * MAX_UPSCALE, 80 * MAX_UPSCALE)
+
+
+def test_adaptive_resize_multi_line_crops():
+    # A description keeps one target-height line per text line
+    resized, lines = adaptive_resize(paragraph(3), single_line=False)
+    assert lines == 3
+    assert resized.shape[0] == 3 * TARGET_LINE_HEIGHT
+
+    # A title wrapped on two lines is narrow for its height and is counted too
+    wrapped, lines = adaptive_resize(paragraph(2, width=200), single_line=True)
+    assert lines == 2
+    assert wrapped.shape[0] == 2 * TARGET_LINE_HEIGHT
+
+
+def test_adaptive_resize_returns_an_owned_grayscale_copy():
+    first, _ = adaptive_resize(cv2.cvtColor(text_crop("12,50", scale=1.2), cv2.COLOR_GRAY2BGR))
+    snapshot = first.copy()
+    adaptive_resize(np.zeros((48, 300, 3), dtype=np.uint8))
+
+    assert first.ndim == 2
+    # The thread scratch buffer was reused by the second call without touching the first result
+    assert np.array_equal(first, snapshot)
+
+
+def test_adaptive_resize_empty_crop():
+    resized, lines = adaptive_resize(np.zeros((0, 10, 3), dtype=np.uint8))
+    assert resized.shape == (0, 10) and lines == 1
@@ -0,0 +1,123 @@
+"""
+Layout engine for menu pages: a spatial index over detected boxes, column clustering and reading order.
+
+IntervalIndex keeps boxes sorted by their top edge, so the boxes contained in a region are
+found with a binary search instead of a scan over every box of the page. reading_order groups
+items into columns by the overlap of their horizontal extents, which tolerates skewed photos
+where a column drifts by more than a few pixels, then reads each column top to bottom.
+"""
+import numpy as np
+
+# Two boxes belong to the same column when their horizontal extents overlap by at least this
+# fraction of the narrower one
+COLUMN_OVERLAP = 0.5
+
+
+class IntervalIndex:
+    """
+    Boxes sorted by their top edge, answering containment queries by range lookups.
+
+    A box contained in a region has its top edge between the region's top and bottom, so a
+    binary search over the sorted top edges yields the few candidates of a horizontal band,
+    which are then checked exactly. Many regions are queried at once with vectorized lookups.
+    """
+
+    def __init__(self, boxes):
+        """
+        Args:
+            boxes (array-like): Array of shape (N, 4) with [x1, y1, x2, y2] rows.
+        """
+        self.boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        self.order = np.argsort(self.boxes[:, 1], kind="stable")
+        self.tops = self.boxes[self.order, 1]
+
+    def contained_pairs(self, regions):
+        """
+        Finds every (region, box) pair where the box is fully contained in the region.
+
+        Args:
+            regions (array-like): Array of shape (M, 4) with [x1, y1, x2, y2] rows.
+
+        Returns:
+            tuple: (region indices, box indices), two aligned arrays with one entry per pair.
+        """
+        regions = np.asarray(regions, dtype=np.float64).reshape(-1, 4)
+        start = np.searchsorted(self.tops, regions[:, 1], side="left")
+        counts = np.searchsorted(self.tops, regions[:, 3], side="right") - start
+
+        # Expand each region's range of sorted positions into (region, position) pairs
+        region_indices = np.repeat(np.arange(len(regions)), counts)
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        box_indices = self.order[np.repeat(start, counts) + offsets]
+
+        boxes, bounds = self.boxes[box_indices], regions[region_indices]
+        inside = (boxes[:, 0] >= bounds[:, 0]) & (boxes[:, 2] <= bounds[:, 2]) & (boxes[:, 3] <= bounds[:, 3])
+        return region_indices[inside], box_indices[inside]
+
+    def contained_in(self, region):
+        """
+        Returns the boxes fully contained in a region.
+
+        Args:
+            region (tuple): Region (x1, y1, x2, y2).
+
+        Returns:
+            numpy array: Sorted indices of the boxes.
+        """
+        return np.sort(self.contained_pairs([region[:4]])[1])
+
+
+def cluster_columns(boxes, min_overlap=COLUMN_OVERLAP):
+    """
+    Groups boxes into columns by the overlap of their horizontal extents.
+
+    Boxes are swept from left to right; each one joins the current column if it overlaps the
+    column's mean extent by at least min_overlap of the narrower of the two, otherwise it starts
+    a new column. The mean extent keeps an occasional wide box from merging two columns.
+
+    Args:
+        boxes (array-like): Array of shape (N, 4) with [x1, y1, x2, y2] rows.
+        min_overlap (float): Minimum overlap, as a fraction of the narrower width.
+
+    Returns:
+        list: One array of box indices per column, from left to right.
+    """
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    columns = []
+    left = right = 0.0
+    for index in np.lexsort((boxes[:, 1], boxes[:, 0])):
+        x1, x2 = boxes[index, 0], boxes[index, 2]
+        if columns:
+            overlap = min(x2, right) - max(x1, left)
+            if overlap >= min_overlap * max(min(x2 - x1, right - left), 1e-9):
+                column = columns[-1]
+                column.append(index)
+                # Running mean of the extents of the column
+                left += (x1 - left) / len(column)
+                right += (x2 - right) / len(column)
+                continue
+        columns.append([index])
+        left, right = x1, x2
+    return [np.array(column, dtype=np.int64) for column in columns]
+
+
+def reading_order(boxes, min_overlap=COLUMN_OVERLAP):
+    """
+    Orders boxes column by column, left to right, and top to bottom within each column.
+
+    Sorting dominates, so the cost is O(n log n). Ties are broken by x1 and then by input
+    position, so the same boxes always come out in the same order.
+
+    Args:
+        boxes (array-like): Array of shape (N, 4) with [x1, y1, x2, y2] rows.
+        min_overlap (float): Column overlap threshold (see cluster_columns).
+
+    Returns:
+        list: Indices of the boxes in reading order.
+    """
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    order = []
+    for column in cluster_columns(boxes, min_overlap):
+        # np.lexsort is stable and sorts by its last key first
+        order.extend(column[np.lexsort((column, boxes[column, 0], boxes[column, 1]))].tolist())
+    return order
@@ -1,28 +1,103 @@
-from ultralytics import YOLO
+import sys
+import os
 import cv2
+import numpy as np
 
-# Load your trained YOLO model
-model = YOLO('./yolov8_menu_card/menu_items_model/weights/best.pt')  # Update with the path to your trained model file
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from model_registry import get_yolo, DEFAULT_YOLO_WEIGHTS
+from image_io import load_image, describe_source
+from instrumentation import stage_timer, count
+from yolov8_menu_card.layout import IntervalIndex
 
-def get_bounding_boxes(image_path, draw=False, output_path="output_with_bboxes.jpg"):
+# Class ID of the bounding box covering a whole menu item
+ITEM_CLASS = 1
+
+# Class IDs of the components contained in an item
+COMPONENT_CLASSES = {
+    0: "description",
+    2: "price",
+    3: "title"
+}
+
+# Side of the square tiles of tiled detection, the training input size (see menu_items_model/args.yaml)
+TILE_SIZE = 640
+
+# Fraction of a tile shared with its neighbour
+TILE_OVERLAP = 0.2
+
+# Tiles whose gray levels vary less than this standard deviation hold no text and are skipped
+BLANK_TILE_STD = 6.0
+
+# Boxes closer than this many pixels to an inner tile edge are treated as cut by the seam
+SEAM_MARGIN = 2
+
+def get_bounding_boxes(image_source, draw=False, output_path="output_with_bboxes.jpg", weights_path=DEFAULT_YOLO_WEIGHTS, detect_scale=1, tile_size=None, tile_overlap=TILE_OVERLAP):
     """
     Function to get bounding boxes from an image using YOLOv8.
     
     Args:
-        image_path (str): Path to the input image.
+        image_source (str | bytes | numpy array): Path to the input image, its encoded bytes, or the
+                                                  already decoded BGR image (which is never modified).
         draw (bool): If True, draws the bounding boxes on the image and saves it.
         output_path (str): Path to save the image with drawn bounding boxes (if draw is True).
+        weights_path (str): Path to the trained YOLO weights (.pt, or .onnx for the ONNX Runtime
+                            backend), loaded on first use.
+        detect_scale (int): Downscaling factor (1, 2, 4 or 8) of the detector input. Paths and bytes
+                            are decoded directly at that resolution. Boxes are returned in
+                            full-resolution coordinates.
+        tile_size (int, optional): If set, the page is detected in overlapping tiles of this size
+                                   (see detect_tiled), so small boxes of very large pages are not
+                                   lost when the whole page is shrunk to the network input.
+        tile_overlap (float): Fraction of a tile shared with its neighbour, in tiled mode.
     
     Returns:
         list: A list of bounding boxes, where each bounding box is represented as
               [x1, y1, x2, y2, confidence, class_id].
     """
     # Load and preprocess the image
-    image = cv2.imread(image_path)
+    if isinstance(image_source, np.ndarray) and detect_scale == 1:
+        image = image_source
+    else:
+        with stage_timer("detect_resize" if isinstance(image_source, np.ndarray) else "decode"):
+            image = load_image(image_source, reduce_factor=detect_scale)
+    if image is None:
+        raise ValueError(f"Could not load image from {describe_source(image_source)}")
     
     # Get predictions from the model
-    results = model.predict(source=image, save=False)
+    model = get_yolo(weights_path)
+    if tile_size:
+        bounding_boxes = detect_tiled(model, image, tile_size=tile_size, overlap=tile_overlap)
+    else:
+        with stage_timer("detect"):
+            results = model.predict(source=image, save=False)
+        
+        # Extract bounding boxes, confidence scores, and class IDs
+        bounding_boxes = boxes_from_result(results[0])
+    count("detections", len(bounding_boxes))
+    
+    # Draw the bounding boxes if 'draw' is set to True
+    if draw:
+        # Never draw on a caller's decoded image, it may be reused for the OCR crops
+        if image is image_source:
+            image = image.copy()
+        draw_bounding_boxes(image, bounding_boxes, output_path)
     
+    # Map the boxes back to full-resolution coordinates
+    if detect_scale != 1:
+        for box in bounding_boxes:
+            box[:4] = [coord * detect_scale for coord in box[:4]]
+    
+    return bounding_boxes
+
+def draw_bounding_boxes(image, bounding_boxes, output_path="output_with_bboxes.jpg"):
+    """
+    Draws bounding boxes on the image, colored by class, and saves it.
+    
+    Args:
+        image (numpy array): BGR image to draw on (modified in place).
+        bounding_boxes (list): List of bounding boxes with format [x1, y1, x2, y2, confidence, class_id].
+        output_path (str): Path to save the image with drawn bounding boxes.
+    """
     # Define colors for each class_id
     colors = {
         0: (255, 0, 0),    
@@ -31,30 +106,196 @@ def get_bounding_boxes(image_path, draw=False, output_path="output_with_bboxes.j
         3: (128, 0, 128)
     }
     
-    # Extract bounding boxes, confidence scores, and class IDs
+    for box in bounding_boxes:
+        x1, y1, x2, y2, confidence, class_id = box
+        
+        # Get color based on class_id, default to white if class_id is unknown
+        color = colors.get(int(class_id), (255, 255, 255))
+        label = f"Class {class_id}: {confidence:.2f}"
+        
+        # Draw the bounding box with the corresponding color
+        cv2.rectangle(image, (int(x1), int(y1)), (int(x2), int(y2)), color, 2)
+        # Add label text above the bounding box
+        cv2.putText(image, label, (int(x1), int(y1) - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
+
+    # Save the image with bounding boxes
+    cv2.imwrite(output_path, image)
+    print(f"Image with bounding boxes saved to {output_path}")
+
+def boxes_from_result(result):
+    """
+    Converts a single YOLO result into a list of bounding boxes.
+
+    Args:
+        result (ultralytics Results | numpy array): Prediction result for one image, or the
+                                                    (K, 6) array returned by the ONNX backend.
+
+    Returns:
+        list: A list of bounding boxes, where each bounding box is represented as
+              [x1, y1, x2, y2, confidence, class_id].
+    """
+    data = result if isinstance(result, np.ndarray) else result.boxes.data.cpu().numpy()
     bounding_boxes = []
-    for box in results[0].boxes.data.cpu().numpy():
+    for box in data:
         x1, y1, x2, y2, confidence, class_id = box
         bounding_boxes.append([x1, y1, x2, y2, confidence, int(class_id)])
-        
-        # Draw the bounding box if 'draw' is set to True
-        if draw:
-            # Get color based on class_id, default to white if class_id is unknown
-            color = colors.get(int(class_id), (255, 255, 255))
-            label = f"Class {class_id}: {confidence:.2f}"
-            
-            # Draw the bounding box with the corresponding color
-            cv2.rectangle(image, (int(x1), int(y1)), (int(x2), int(y2)), color, 2)
-            # Add label text above the bounding box
-            cv2.putText(image, label, (int(x1), int(y1) - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
-
-    # Save the image with bounding boxes if drawing is enabled
-    if draw:
-        cv2.imwrite(output_path, image)
-        print(f"Image with bounding boxes saved to {output_path}")
-    
     return bounding_boxes
 
+def get_bounding_boxes_batch(paths_or_arrays, batch_size=8, weights_path=DEFAULT_YOLO_WEIGHTS):
+    """
+    Function to get bounding boxes from several images using batched YOLOv8 inference.
+
+    Images are letterboxed to the model input size and stacked, so each chunk of
+    batch_size pages runs in a single forward pass.
+
+    Args:
+        paths_or_arrays (list): Image paths, encoded image bytes and/or already decoded BGR images (numpy arrays).
+        batch_size (int): Number of images sent to the model in one forward pass.
+        weights_path (str): Path to the trained YOLO weights, loaded on first use.
+
+    Returns:
+        list: One list of bounding boxes per input image, in input order, where each
+              bounding box is represented as [x1, y1, x2, y2, confidence, class_id].
+    """
+    model = get_yolo(weights_path)
+    all_boxes = []
+    for start in range(0, len(paths_or_arrays), batch_size):
+        # Load the images of this chunk
+        images = []
+        for source in paths_or_arrays[start:start + batch_size]:
+            with stage_timer("decode"):
+                image = load_image(source)
+            if image is None:
+                raise ValueError(f"Could not load image from {describe_source(source)}")
+            images.append(image)
+
+        # A list source is letterboxed and stacked into one batch by the predictor
+        with stage_timer("detect"):
+            results = model.predict(source=images, save=False, batch=len(images))
+        for result in results:
+            all_boxes.append(boxes_from_result(result))
+            count("detections", len(all_boxes[-1]))
+
+    return all_boxes
+
+def tile_origins(length, tile_size, overlap):
+    """
+    Computes the start positions of the tiles along one side of the image.
+
+    Args:
+        length (int): Length of the side, in pixels.
+        tile_size (int): Length of a tile.
+        overlap (float): Fraction of a tile shared with the next one.
+
+    Returns:
+        list: Start positions; the last tile ends exactly at the image border.
+    """
+    if length <= tile_size:
+        return [0]
+    stride = max(1, int(tile_size * (1 - overlap)))
+    return list(range(0, length - tile_size, stride)) + [length - tile_size]
+
+def merge_boxes(boxes, iou_threshold=0.5, containment_threshold=0.8):
+    """
+    Merges duplicate detections of the same object with class-aware greedy suppression.
+
+    A box is dropped if a more confident box of the same class overlaps it by more than
+    iou_threshold, or covers more than containment_threshold of its area (the part of an
+    object seen by a tile that cut it).
+
+    Args:
+        boxes (numpy array): Array of shape (N, 6) with [x1, y1, x2, y2, confidence, class_id] rows.
+        iou_threshold (float): IoU above which two boxes are duplicates.
+        containment_threshold (float): Fraction of a box covered by a better box above which it is dropped.
+
+    Returns:
+        numpy array: The kept rows, by decreasing confidence.
+    """
+    order = boxes[:, 4].argsort()[::-1]
+    boxes = boxes[order]
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    suppressed = np.zeros(len(boxes), dtype=bool)
+    for best in range(len(boxes)):
+        if suppressed[best]:
+            continue
+        rest = np.arange(best + 1, len(boxes))
+        rest = rest[~suppressed[rest] & (boxes[rest, 5] == boxes[best, 5])]
+        width = np.clip(np.minimum(boxes[best, 2], boxes[rest, 2]) - np.maximum(boxes[best, 0], boxes[rest, 0]), 0, None)
+        height = np.clip(np.minimum(boxes[best, 3], boxes[rest, 3]) - np.maximum(boxes[best, 1], boxes[rest, 1]), 0, None)
+        intersection = width * height
+        iou = intersection / (areas[best] + areas[rest] - intersection + 1e-9)
+        covered = intersection / (areas[rest] + 1e-9)
+        suppressed[rest[(iou > iou_threshold) | (covered > containment_threshold)]] = True
+    return boxes[~suppressed]
+
+def detect_tiled(model, image, tile_size=TILE_SIZE, overlap=TILE_OVERLAP, batch_size=8, blank_std=BLANK_TILE_STD, full_pass=True):
+    """
+    Detects boxes on overlapping tiles of a large page and merges them across the tile seams.
+
+    Tiles are cut at full resolution, so small boxes such as prices keep enough pixels, and
+    sent to the detector in batches. Blank tiles (margins, plain backgrounds) are skipped
+    by a cheap variance check, so the cost follows the amount of text rather than the page
+    size. Item boxes usually span several tiles, so with full_pass they are taken from an
+    extra pass over the whole (downsized) page instead of from the tiles.
+
+    Args:
+        model (YOLO | OnnxDetector): The detector.
+        image (numpy array): BGR page.
+        tile_size (int): Side of the square tiles, in pixels.
+        overlap (float): Fraction of a tile shared with its neighbour.
+        batch_size (int): Number of tiles per detector call.
+        blank_std (float, optional): Tiles whose gray level standard deviation is below this are
+                                     skipped. None keeps every tile.
+        full_pass (bool): If True, item boxes come from a pass over the whole page.
+
+    Returns:
+        list: A list of bounding boxes, where each bounding box is represented as
+              [x1, y1, x2, y2, confidence, class_id].
+    """
+    height, width = image.shape[:2]
+    tiles = []
+    for y0 in tile_origins(height, tile_size, overlap):
+        for x0 in tile_origins(width, tile_size, overlap):
+            tile = image[y0:y0 + tile_size, x0:x0 + tile_size]
+            # Subsample the tile so the check costs a fraction of the detection
+            if blank_std is not None and tile[::4, ::4].std() < blank_std:
+                count("tiles_skipped")
+                continue
+            tiles.append((x0, y0, tile))
+    count("tiles", len(tiles))
+
+    # Boxes smaller than the overlap are always seen whole by some tile
+    overlap_pixels = tile_size * overlap
+    candidates = []
+    for start in range(0, len(tiles), batch_size):
+        chunk = tiles[start:start + batch_size]
+        with stage_timer("detect"):
+            results = model.predict(source=[np.ascontiguousarray(tile) for _, _, tile in chunk], save=False, batch=len(chunk))
+        for (x0, y0, tile), result in zip(chunk, results):
+            tile_height, tile_width = tile.shape[:2]
+            for x1, y1, x2, y2, confidence, class_id in boxes_from_result(result):
+                if full_pass and class_id == ITEM_CLASS:
+                    continue
+                # Drop small boxes cut by an inner seam; the neighbouring tile holds them whole
+                cut = (
+                    (x1 <= SEAM_MARGIN and x0 > 0) or (y1 <= SEAM_MARGIN and y0 > 0) or
+                    (x2 >= tile_width - SEAM_MARGIN and x0 + tile_width < width) or
+                    (y2 >= tile_height - SEAM_MARGIN and y0 + tile_height < height)
+                )
+                if cut and x2 - x1 < overlap_pixels and y2 - y1 < overlap_pixels:
+                    continue
+                candidates.append([x1 + x0, y1 + y0, x2 + x0, y2 + y0, confidence, class_id])
+
+    if full_pass:
+        with stage_timer("detect"):
+            results = model.predict(source=image, save=False)
+        candidates.extend(boxes_from_result(results[0]))
+
+    if not candidates:
+        return []
+    merged = merge_boxes(np.array(candidates, dtype=np.float32))
+    return [[x1, y1, x2, y2, confidence, int(class_id)] for x1, y1, x2, y2, confidence, class_id in merged]
+
 def is_contained(inner, outer):
     """
     Check if 'inner' bbox is fully within 'outer' bbox.
@@ -74,6 +315,10 @@ def is_contained(inner, outer):
 def organize_items_with_contained_components(bounding_boxes):
     """
     Organizes bounding boxes into items and their contained components (price, title, description).
+
+    Components are put in an IntervalIndex, so each item is only checked against the components
+    whose top edge falls within its vertical extent. When several boxes of the same component
+    class are contained in an item, the one with the highest confidence is kept.
     
     Args:
         bounding_boxes (list): List of bounding boxes with format [x1, y1, x2, y2, confidence, class_id].
@@ -81,45 +326,41 @@ def organize_items_with_contained_components(bounding_boxes):
     Returns:
         dict: A dictionary where each key is an item bbox and the value is a dictionary of contained components.
     """
-    # Separate item bounding boxes and other bounding boxes
-    item_bboxes = [box for box in bounding_boxes if box[5] == 1]  # assuming label '1' indicates item bounding boxes
-    other_bboxes = {
-        0: [],  # descriptions
-        2: [],  # prices
-        3: []   # titles
-    }
-    
-    # Sort other boxes by class ID
-    for box in bounding_boxes:
-        if box[5] == 0:  # description
-            other_bboxes[0].append(box)
-        elif box[5] == 2:  # price
-            other_bboxes[2].append(box)
-        elif box[5] == 3:  # title
-            other_bboxes[3].append(box)
-    
-    # Initialize dictionary to store the result
     result = {}
+    if len(bounding_boxes) == 0:
+        return result
 
-    # Loop over each item bounding box and find contained boxes
-    for item_bbox in item_bboxes:
-        contained_data = {"price": None, "title": None, "description": None}
+    boxes = np.array([box[:6] for box in bounding_boxes], dtype=np.float64)
+    class_ids = boxes[:, 5].astype(int)
 
-        # Check for each type of component within the item bbox
-        for label, bbox_list in other_bboxes.items():
-            for bbox in bbox_list:
-                if is_contained(bbox[:4], item_bbox[:4]):
-                    # Map the contained bbox to the correct category
-                    if label == 2:  # Assuming label '2' is for price
-                        contained_data["price"] = bbox[:4]
-                    elif label == 3:  # Assuming label '3' is for title
-                        contained_data["title"] = bbox[:4]
-                    elif label == 0:  # Assuming label '0' is for description
-                        contained_data["description"] = bbox[:4]
+    # Separate item bounding boxes and component bounding boxes
+    item_indices = np.flatnonzero(class_ids == ITEM_CLASS)
+    component_indices = np.flatnonzero(np.isin(class_ids, list(COMPONENT_CLASSES)))
+    if len(item_indices) == 0:
+        return result
+
+    # Containment pairs (item, component) found by range lookups
+    item_rows, matches = IntervalIndex(boxes[component_indices, :4]).contained_pairs(boxes[item_indices, :4])
+    matches = component_indices[matches]
+
+    # For each item and component class, keep the most confident box (the first one on ties)
+    order = np.lexsort((matches, -boxes[matches, 4], class_ids[matches], item_rows))
+    item_rows, matches = item_rows[order], matches[order]
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = (item_rows[1:] != item_rows[:-1]) | (class_ids[matches[1:]] != class_ids[matches[:-1]])
+
+    best_match = {}
+    for row, match in zip(item_rows[first], matches[first]):
+        best_match.setdefault(row, {})[COMPONENT_CLASSES[class_ids[match]]] = match
+
+    for row, item_index in enumerate(item_indices):
+        contained_data = {"price": None, "title": None, "description": None}
+        for name, match in best_match.get(row, {}).items():
+            contained_data[name] = bounding_boxes[match][:4]
 
         # Only add to the result if there are contained elements
-        if any(contained_data.values()):
-            result[tuple(item_bbox[:4])] = contained_data
+        if any(value is not None for value in contained_data.values()):
+            result[tuple(bounding_boxes[item_index][:4])] = contained_data
 
     return result
 
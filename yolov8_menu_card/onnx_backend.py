@@ -0,0 +1,287 @@
+"""
+ONNX Runtime backend for the menu detector, for CPU-only inference workers.
+
+The trained best.pt is exported once to ONNX (optionally quantized to INT8 with calibration
+on menu images). OnnxDetector then runs it with ONNX Runtime, doing the YOLOv8 letterbox
+preprocessing and NMS postprocessing in numpy, so neither torch nor ultralytics is imported
+at inference time. The model registry loads it for any weights path ending in '.onnx'.
+"""
+import sys
+import os
+import cv2
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from image_io import load_image, describe_source
+
+# Default network input size, as used for training (see menu_items_model/args.yaml)
+DEFAULT_IMGSZ = 640
+
+# Ultralytics predict defaults, so both backends keep the same boxes
+DEFAULT_CONF = 0.25
+DEFAULT_IOU = 0.7
+MAX_DETECTIONS = 300
+
+# Gray value of the letterbox padding
+PAD_VALUE = 114
+
+
+def letterbox(image, size=DEFAULT_IMGSZ):
+    """
+    Resizes an image keeping its aspect ratio and pads it to a square network input.
+
+    Args:
+        image (numpy array): BGR image.
+        size (int): Side of the square network input.
+
+    Returns:
+        tuple: (input tensor of shape (3, size, size) as RGB float32 in [0, 1],
+                resize ratio, (left, top) padding in pixels).
+    """
+    height, width = image.shape[:2]
+    ratio = min(size / height, size / width)
+    new_width, new_height = int(round(width * ratio)), int(round(height * ratio))
+    if (new_width, new_height) != (width, height):
+        image = cv2.resize(image, (new_width, new_height), interpolation=cv2.INTER_LINEAR)
+
+    # Split the padding between both sides, like the ultralytics letterbox
+    pad_x, pad_y = (size - new_width) / 2, (size - new_height) / 2
+    left, top = int(round(pad_x - 0.1)), int(round(pad_y - 0.1))
+    right, bottom = int(round(pad_x + 0.1)), int(round(pad_y + 0.1))
+    padded = cv2.copyMakeBorder(image, top, bottom, left, right, cv2.BORDER_CONSTANT, value=(PAD_VALUE,) * 3)
+
+    # BGR HWC uint8 -> RGB CHW float32
+    tensor = padded[:, :, ::-1].transpose(2, 0, 1).astype(np.float32) / 255.0
+    return np.ascontiguousarray(tensor), ratio, (left, top)
+
+
+def non_max_suppression(boxes, scores, class_ids, iou_threshold=DEFAULT_IOU, max_detections=MAX_DETECTIONS):
+    """
+    Class-aware greedy non-maximum suppression.
+
+    Args:
+        boxes (numpy array): Array of shape (N, 4) with [x1, y1, x2, y2] rows.
+        scores (numpy array): Confidence of each box, shape (N,).
+        class_ids (numpy array): Class of each box, shape (N,). Boxes of different classes never suppress each other.
+        iou_threshold (float): Boxes overlapping a kept box by more than this IoU are dropped.
+        max_detections (int): Maximum number of boxes kept.
+
+    Returns:
+        numpy array: Indices of the kept boxes, by decreasing score.
+    """
+    # Shift each class to its own region so a single pass never mixes classes
+    offset = class_ids[:, None].astype(np.float32) * (boxes.max() + 1 if len(boxes) else 0)
+    shifted = boxes + offset
+    areas = (shifted[:, 2] - shifted[:, 0]) * (shifted[:, 3] - shifted[:, 1])
+
+    order = scores.argsort()[::-1]
+    keep = []
+    while len(order) and len(keep) < max_detections:
+        best, rest = order[0], order[1:]
+        keep.append(best)
+        width = np.clip(np.minimum(shifted[best, 2], shifted[rest, 2]) - np.maximum(shifted[best, 0], shifted[rest, 0]), 0, None)
+        height = np.clip(np.minimum(shifted[best, 3], shifted[rest, 3]) - np.maximum(shifted[best, 1], shifted[rest, 1]), 0, None)
+        intersection = width * height
+        iou = intersection / (areas[best] + areas[rest] - intersection + 1e-9)
+        order = rest[iou <= iou_threshold]
+    return np.array(keep, dtype=int)
+
+
+def decode_predictions(prediction, ratio, padding, image_shape, conf_threshold=DEFAULT_CONF, iou_threshold=DEFAULT_IOU):
+    """
+    Converts the raw YOLOv8 output of one image into boxes in image coordinates.
+
+    Args:
+        prediction (numpy array): Raw output of shape (4 + num_classes, num_anchors), with
+                                  (cx, cy, w, h) rows followed by one score row per class.
+        ratio (float): Resize ratio used by letterbox.
+        padding (tuple): (left, top) padding used by letterbox.
+        image_shape (tuple): Shape of the original image.
+        conf_threshold (float): Minimum class score of a box.
+        iou_threshold (float): IoU threshold of the non-maximum suppression.
+
+    Returns:
+        numpy array: Array of shape (K, 6) with [x1, y1, x2, y2, confidence, class_id] rows.
+    """
+    prediction = prediction.T
+    class_scores = prediction[:, 4:]
+    class_ids = class_scores.argmax(axis=1)
+    scores = class_scores[np.arange(len(class_scores)), class_ids]
+
+    mask = scores > conf_threshold
+    xywh, scores, class_ids = prediction[mask, :4], scores[mask], class_ids[mask]
+    if len(scores) == 0:
+        return np.zeros((0, 6), dtype=np.float32)
+
+    # (cx, cy, w, h) in network input -> (x1, y1, x2, y2) in the original image
+    boxes = np.empty_like(xywh)
+    boxes[:, :2] = xywh[:, :2] - xywh[:, 2:] / 2
+    boxes[:, 2:] = xywh[:, :2] + xywh[:, 2:] / 2
+    keep = non_max_suppression(boxes, scores, class_ids, iou_threshold)
+    boxes, scores, class_ids = boxes[keep], scores[keep], class_ids[keep]
+
+    boxes -= np.array([padding[0], padding[1], padding[0], padding[1]], dtype=boxes.dtype)
+    boxes /= ratio
+    boxes[:, [0, 2]] = boxes[:, [0, 2]].clip(0, image_shape[1])
+    boxes[:, [1, 3]] = boxes[:, [1, 3]].clip(0, image_shape[0])
+
+    return np.column_stack([boxes, scores, class_ids]).astype(np.float32)
+
+
+class OnnxDetector:
+    """
+    YOLOv8 detector running an exported ONNX model with ONNX Runtime.
+
+    predict() mirrors the ultralytics YOLO.predict call used by the pipeline and returns one
+    (K, 6) array of [x1, y1, x2, y2, confidence, class_id] rows per image, which
+    model_detect_bbox.boxes_from_result accepts like an ultralytics result.
+    """
+
+    def __init__(self, model_path, intra_op_threads=None, inter_op_threads=None, providers=None, imgsz=DEFAULT_IMGSZ,
+                 conf=DEFAULT_CONF, iou=DEFAULT_IOU):
+        """
+        Args:
+            model_path (str): Path to the .onnx model (see export_onnx and quantize_onnx).
+            intra_op_threads (int, optional): Threads used inside one operator. Defaults to ONNX Runtime's choice.
+            inter_op_threads (int, optional): Threads used to run independent operators in parallel.
+            providers (list, optional): ONNX Runtime execution providers, e.g.
+                                        ['OpenVINOExecutionProvider', 'CPUExecutionProvider'].
+                                        Defaults to the CPU provider.
+            imgsz (int): Input size, used when the model has a dynamic input shape.
+            conf (float): Minimum class score of a box.
+            iou (float): IoU threshold of the non-maximum suppression.
+        """
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if intra_op_threads is not None:
+            options.intra_op_num_threads = intra_op_threads
+        if inter_op_threads is not None:
+            options.inter_op_num_threads = inter_op_threads
+            options.execution_mode = ort.ExecutionMode.ORT_PARALLEL
+
+        self.session = ort.InferenceSession(model_path, sess_options=options, providers=providers or ["CPUExecutionProvider"])
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        # Exported models have a fixed batch of 1 unless exported with dynamic=True
+        self.fixed_batch = model_input.shape[0] if isinstance(model_input.shape[0], int) else None
+        self.imgsz = model_input.shape[2] if isinstance(model_input.shape[2], int) else imgsz
+        self.conf = conf
+        self.iou = iou
+
+    def predict(self, source, batch=None, **kwargs):
+        """
+        Detects the boxes of one or several images.
+
+        Args:
+            source (str | bytes | numpy array | list): An image (path, encoded bytes or BGR array) or a list of images.
+            batch (int, optional): Images per forward pass; only used by models with a dynamic batch.
+            **kwargs: Other ultralytics predict arguments (e.g. save), ignored.
+
+        Returns:
+            list: One array of shape (K, 6) per image, with [x1, y1, x2, y2, confidence, class_id] rows.
+        """
+        sources = source if isinstance(source, list) else [source]
+        images = []
+        for image_source in sources:
+            image = load_image(image_source)
+            if image is None:
+                raise ValueError(f"Could not load image from {describe_source(image_source)}")
+            images.append(image)
+
+        batch = self.fixed_batch or batch or len(images)
+        results = []
+        for start in range(0, len(images), batch):
+            chunk = images[start:start + batch]
+            inputs = [letterbox(image, self.imgsz) for image in chunk]
+            outputs = self.session.run(None, {self.input_name: np.stack([tensor for tensor, _, _ in inputs])})[0]
+            for prediction, image, (_, ratio, padding) in zip(outputs, chunk, inputs):
+                results.append(decode_predictions(prediction, ratio, padding, image.shape, self.conf, self.iou))
+        return results
+
+
+def export_onnx(weights_path, output_path=None, imgsz=DEFAULT_IMGSZ, dynamic=False, opset=12):
+    """
+    Exports YOLO weights to ONNX. This is the only step that needs torch and ultralytics.
+
+    Args:
+        weights_path (str): Path to the trained .pt weights.
+        output_path (str, optional): Where to save the model. Defaults to the weights path with an .onnx extension.
+        imgsz (int): Input size of the exported model.
+        dynamic (bool): If True, the batch and image sizes are dynamic, so pages can be batched.
+        opset (int): ONNX opset version.
+
+    Returns:
+        str: Path of the exported model.
+    """
+    from ultralytics import YOLO
+
+    exported_path = YOLO(weights_path).export(format="onnx", imgsz=imgsz, dynamic=dynamic, opset=opset, simplify=True)
+    if output_path is not None and os.path.abspath(output_path) != os.path.abspath(exported_path):
+        os.replace(exported_path, output_path)
+        return output_path
+    return exported_path
+
+
+def quantize_onnx(model_path, calibration_images, output_path=None, imgsz=DEFAULT_IMGSZ, per_channel=False):
+    """
+    Quantizes an ONNX model to INT8 with static quantization, calibrated on menu images.
+
+    Args:
+        model_path (str): Path to the float ONNX model.
+        calibration_images (list): Paths of representative menu images (a few dozen are enough).
+        output_path (str, optional): Where to save the model. Defaults to '<model>_int8.onnx'.
+        imgsz (int): Input size of the model.
+        per_channel (bool): If True, weights are quantized per output channel (more accurate, slower on some CPUs).
+
+    Returns:
+        str: Path of the quantized model.
+    """
+    from onnxruntime.quantization import CalibrationDataReader, QuantFormat, QuantType, quantize_static
+    import onnxruntime as ort
+
+    if output_path is None:
+        output_path = f"{os.path.splitext(model_path)[0]}_int8.onnx"
+    input_name = ort.InferenceSession(model_path, providers=["CPUExecutionProvider"]).get_inputs()[0].name
+
+    class MenuCalibrationReader(CalibrationDataReader):
+        """
+        Feeds the letterboxed calibration images one at a time.
+        """
+        def __init__(self):
+            self.paths = iter(calibration_images)
+
+        def get_next(self):
+            for path in self.paths:
+                image = load_image(path)
+                if image is not None:
+                    return {input_name: letterbox(image, imgsz)[0][None]}
+            return None
+
+    quantize_static(
+        model_path, output_path, MenuCalibrationReader(),
+        quant_format=QuantFormat.QDQ, activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8,
+        per_channel=per_channel
+    )
+    return output_path
+
+
+# Example usage: export the trained model and quantize it with the sample menus
+if __name__ == "__main__":
+    import argparse
+    from model_registry import DEFAULT_YOLO_WEIGHTS
+
+    parser = argparse.ArgumentParser(description="Export the menu detector to ONNX.")
+    parser.add_argument("--weights", default=DEFAULT_YOLO_WEIGHTS, help="Path to the trained .pt weights")
+    parser.add_argument("--output", default=None, help="Path of the exported .onnx model")
+    parser.add_argument("--dynamic", action="store_true", help="Export with dynamic batch and image sizes")
+    parser.add_argument("--int8", action="store_true", help="Also write an INT8 model calibrated on --calibration-dir")
+    parser.add_argument("--calibration-dir", default="./real_menu_card_images", help="Directory of calibration menu images")
+    args = parser.parse_args()
+
+    onnx_path = export_onnx(args.weights, args.output, dynamic=args.dynamic)
+    print(f"ONNX model saved to {onnx_path}")
+    if args.int8:
+        calibration_images = sorted(os.path.join(args.calibration_dir, name) for name in os.listdir(args.calibration_dir))
+        print(f"INT8 model saved to {quantize_onnx(onnx_path, calibration_images)}")
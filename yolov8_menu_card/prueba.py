@@ -1,10 +1,12 @@
-from ultralytics import YOLO
+import sys
+import os
 import cv2
+import numpy as np
 
-# Load your trained YOLO model
-model = YOLO('./yolov8_menu_card/menu_items_model/weights/best.pt')  # Update with the path to your trained model file
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from model_registry import get_yolo, DEFAULT_YOLO_WEIGHTS
 
-def get_bounding_boxes(image_path, draw=False, output_path="output_with_bboxes.jpg"):
+def get_bounding_boxes(image_path, draw=False, output_path="output_with_bboxes.jpg", weights_path=DEFAULT_YOLO_WEIGHTS):
     """
     Function to get bounding boxes from an image using YOLOv8.
     
@@ -12,6 +14,7 @@ def get_bounding_boxes(image_path, draw=False, output_path="output_with_bboxes.j
         image_path (str): Path to the input image.
         draw (bool): If True, draws the bounding boxes on the image and saves it.
         output_path (str): Path to save the image with drawn bounding boxes (if draw is True).
+        weights_path (str): Path to the trained YOLO weights, loaded on first use.
     
     Returns:
         list: A list of bounding boxes, where each bounding box is represented as
@@ -21,7 +24,7 @@ def get_bounding_boxes(image_path, draw=False, output_path="output_with_bboxes.j
     image = cv2.imread(image_path)
     
     # Get predictions from the model
-    results = model.predict(source=image, save=False)
+    results = get_yolo(weights_path).predict(source=image, save=False)
     
     # Extract bounding boxes, confidence scores, and class IDs
     bounding_boxes = []
@@ -72,9 +75,39 @@ def calculate_iou(box1, box2):
     iou = inter_area / union_area if union_area > 0 else 0
     return iou
 
+def batch_iou(boxes1, boxes2):
+    """
+    Calculate Intersection over Union (IoU) between every pair of bounding boxes of two sets.
+    
+    Args:
+        boxes1 (numpy array): Array of shape (N, 4) with [x1, y1, x2, y2] rows.
+        boxes2 (numpy array): Array of shape (M, 4) with [x1, y1, x2, y2] rows.
+    
+    Returns:
+        numpy array: Array of shape (N, M) with IoU values between 0 and 1.
+    """
+    b1 = boxes1[:, None, :]
+    b2 = boxes2[None, :, :]
+    
+    # Calculate intersection area
+    inter_w = np.clip(np.minimum(b1[..., 2], b2[..., 2]) - np.maximum(b1[..., 0], b2[..., 0]), 0, None)
+    inter_h = np.clip(np.minimum(b1[..., 3], b2[..., 3]) - np.maximum(b1[..., 1], b2[..., 1]), 0, None)
+    inter_area = inter_w * inter_h
+    
+    # Calculate union area
+    area1 = (b1[..., 2] - b1[..., 0]) * (b1[..., 3] - b1[..., 1])
+    area2 = (b2[..., 2] - b2[..., 0]) * (b2[..., 3] - b2[..., 1])
+    union_area = area1 + area2 - inter_area
+    
+    # Calculate IoU
+    return np.divide(inter_area, union_area, out=np.zeros_like(inter_area), where=union_area > 0)
+
 def organize_items_by_components(bounding_boxes, iou_threshold=0.3):
     """
     Organizes detected bounding boxes into items with their respective components.
+
+    When several components of the same kind overlap an item enough, the one with
+    the highest confidence is kept.
     
     Args:
         bounding_boxes (list): List of bounding boxes with format:
@@ -84,41 +117,32 @@ def organize_items_by_components(bounding_boxes, iou_threshold=0.3):
     Returns:
         list: A list where each item contains its title, description, and price bounding boxes.
     """
-    items = []
-    titles = []
-    descriptions = []
-    prices = []
+    if len(bounding_boxes) == 0:
+        return []
+    
+    boxes = np.array([box[:6] for box in bounding_boxes], dtype=np.float64)
+    class_ids = boxes[:, 5].astype(int)
     
     # Separate bounding boxes by class ID
-    for box in bounding_boxes:
-        x1, y1, x2, y2, confidence, class_id = box
-        if class_id == 0:  # Assuming 'item' is class ID 0
-            items.append({"bbox": [x1, y1, x2, y2], "title": None, "description": None, "price": None})
-        elif class_id == 1:  # Assuming 'title' is class ID 1
-            titles.append({"bbox": [x1, y1, x2, y2], "confidence": confidence})
-        elif class_id == 2:  # Assuming 'description' is class ID 2
-            descriptions.append({"bbox": [x1, y1, x2, y2], "confidence": confidence})
-        elif class_id == 3:  # Assuming 'price' is class ID 3
-            prices.append({"bbox": [x1, y1, x2, y2], "confidence": confidence})
+    item_rows = np.flatnonzero(class_ids == 0)  # Assuming 'item' is class ID 0
+    items = [{"bbox": list(bounding_boxes[row][:4]), "title": None, "description": None, "price": None} for row in item_rows]
+    if not items:
+        return items
     
     # Assign titles, descriptions, and prices to their respective items based on IoU
-    for item in items:
-        item_bbox = item["bbox"]
-        
-        # Find titles with sufficient overlap inside the item bbox
-        for title in titles:
-            if calculate_iou(item_bbox, title["bbox"]) >= iou_threshold:
-                item["title"] = title["bbox"]
+    for class_id, name in ((1, "title"), (2, "description"), (3, "price")):
+        component_rows = np.flatnonzero(class_ids == class_id)
+        if len(component_rows) == 0:
+            continue
         
-        # Find descriptions with sufficient overlap inside the item bbox
-        for description in descriptions:
-            if calculate_iou(item_bbox, description["bbox"]) >= iou_threshold:
-                item["description"] = description["bbox"]
+        # IoU of every item against every component of this class
+        iou = batch_iou(boxes[item_rows, :4], boxes[component_rows, :4])
+        scores = np.where(iou >= iou_threshold, boxes[component_rows, 4][None, :], -np.inf)
+        best = scores.argmax(axis=1)
         
-        # Find prices with sufficient overlap inside the item bbox
-        for price in prices:
-            if calculate_iou(item_bbox, price["bbox"]) >= iou_threshold:
-                item["price"] = price["bbox"]
+        for item, best_col, has_match in zip(items, best, np.isfinite(scores.max(axis=1))):
+            if has_match:
+                item[name] = list(bounding_boxes[component_rows[best_col]][:4])
 
     return items
 
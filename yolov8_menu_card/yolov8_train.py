@@ -37,6 +37,22 @@ class CustomDataset(Dataset):
 
         return image, bboxes
 
+def select_device():
+    """
+    Returns the training device: the first GPU if there is one, Apple MPS, or the CPU.
+    """
+    if torch.cuda.is_available():
+        return 0
+    if getattr(torch.backends, "mps", None) is not None and torch.backends.mps.is_available():
+        return "mps"
+    return "cpu"
+
+def default_workers():
+    """
+    Returns the number of data loading workers: one per CPU, up to 8, keeping a core for training.
+    """
+    return max(min((os.cpu_count() or 1) - 1, 8), 0)
+
 # Define your Albumentations augmentation pipeline
 augmentations = A.Compose([
     A.ToGray(p=1.0),  # Convert to grayscale
@@ -58,12 +74,18 @@ if __name__ == '__main__':
         transform=augmentations
     )
 
-    # Train the model using the custom dataset and transformations
+    device = select_device()
+    print(f"Training on {device}")
+
+    # Train the model with the Ultralytics loader: decoded images are cached on disk and loaded
+    # by parallel workers, so each image is only decoded once across epochs and runs.
     model.train(
         data='./yolov8_menu_card/menu_data/data.yaml',    # Path to your dataset YAML file
         epochs=1000,                      # Number of epochs
         batch=8,                         # Batch size
         imgsz=640,                       # Image size
-        device=0,                        # Use GPU (0 for the first GPU)
+        device=device,                   # First GPU if available, otherwise Apple MPS or CPU
+        workers=default_workers(),       # Parallel data loading workers
+        cache="disk",                    # Keep decoded images as .npy files between epochs and runs
         augment=True                      # Enable augmentations
     )